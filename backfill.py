@@ -0,0 +1,123 @@
+import json
+import logging
+import threading
+from datetime import timedelta
+from functools import partial
+
+from async_engine import Source
+from config import Config
+
+
+class Backfill:
+    """Replay every feed over a date window through the normal pipeline.
+
+    Sources are fetched concurrently by the bot's engine, then tagged,
+    deduplicated and near-duplicate checked per account exactly like a
+    regular run. A dry run writes the resulting posts to NDJSON and changes
+    nothing; otherwise they are queued and posted at most one per
+    post_interval seconds per account, so a catch-up does not flood
+    followers.
+    """
+
+    def __init__(self, bot, post_interval=None, facebook_pages=None):
+        self.bot = bot
+        self.fetcher = bot.content_fetcher
+        self.post_interval = post_interval if post_interval is not None else Config.BACKFILL_POST_INTERVAL
+        self.facebook_pages = facebook_pages if facebook_pages is not None else Config.BACKFILL_FACEBOOK_PAGES
+
+    def run(self, start, end, dry_run_path=None, feed_names=None):
+        """Replay [start, end) given as naive local datetimes; returns how many posts were planned."""
+        dry_run = dry_run_path is not None
+        feeds = [
+            feed for feed in self.bot.feed_config.active_feeds()
+            if not feed_names or feed.name in feed_names
+        ]
+        logging.info(f"Backfilling {', '.join(feed.name for feed in feeds)} from {start:%Y-%m-%d} "
+                     f"to {end:%Y-%m-%d}{' (dry run)' if dry_run else ''}")
+
+        local_start = self.bot.timezone.localize(start)
+        local_end = self.bot.timezone.localize(end)
+        if any(feed.kind in ('events', 'weekly_events') for feed in feeds):
+            # Regular sync first: a full sync drops past events the range sync is about to store
+            self.fetcher._sync_events()
+            self.fetcher.event_sync.sync_range(local_start, local_end)
+
+        sources = [self.source_for(feed, start, end, local_start, local_end, dry_run) for feed in feeds]
+        results = self.bot.fetch_sources(sources, grouped=True)
+
+        planned = 0
+        out = open(dry_run_path, 'w', encoding='utf-8') if dry_run else None
+        try:
+            for source, items in results:
+                for account, posts in self.bot.plan_posts(source.feed, items, record=not dry_run):
+                    planned += len(posts)
+                    if dry_run:
+                        for content_id, content, post_source in posts:
+                            out.write(json.dumps({
+                                'account': account.name,
+                                'feed': source.feed.name,
+                                'source': post_source,
+                                'content_id': content_id,
+                                'content': content,
+                            }, ensure_ascii=False) + '\n')
+                    else:
+                        self.bot.posting_queues[account.key].enqueue(posts)
+                if source.feed.kind == 'events' and not dry_run:
+                    self.fetcher.mark_reminders_queued(content_id for content_id, _, _ in items)
+        finally:
+            if out is not None:
+                out.close()
+
+        if dry_run:
+            logging.info(f"Dry run: wrote {planned} posts to {dry_run_path}")
+        else:
+            logging.info(f"Posting {planned} backfilled posts, one every {self.post_interval:.0f}s per account")
+            self.post_all()
+        return planned
+
+    def source_for(self, feed, start, end, local_start, local_end, dry_run):
+        fetcher = self.fetcher
+        if feed.kind == 'rss':
+            fetch = partial(fetcher.fetch_rss, feed.url, feed.name, hashtags='', dedup=False, since=start, until=end)
+        elif feed.kind == 'facebook':
+            fetch = partial(fetcher.fetch_facebook, feed.page, feed.name, hashtags='', dedup=False,
+                            since=start, until=end, pages=self.facebook_pages)
+        elif feed.kind == 'events':
+            # A dry run replays what would have gone out; for real, reminders
+            # of events that have already started are pointless
+            fetch = partial(fetcher.fetch_reminders_between, local_start, local_end, hashtags='',
+                            upcoming_only=not dry_run, retry_failed=not dry_run)
+        else:
+            fetch = partial(self.weekly_digests, local_start, local_end)
+        return Source(feed.name, fetch, timeout=feed.timeout, feed=feed)
+
+    def weekly_digests(self, local_start, local_end):
+        """One digest for every Monday in the window."""
+        day = local_start.replace(hour=0, minute=0, second=0, microsecond=0)
+        day += timedelta(days=(7 - day.weekday()) % 7)
+        digests = []
+        while day < local_end:
+            digests.extend(self.fetcher.fetch_weekly_events(hashtags='', dedup=False, week_start=day))
+            day = self.bot.timezone.normalize(day + timedelta(days=7))
+        return digests
+
+    def post_all(self):
+        """Drain every account's outbox concurrently, throttled, and wait for it."""
+        threads = []
+        # The queues belong to the bot, so their own pace is put back afterwards
+        intervals = {key: posting_queue.min_interval for key, posting_queue in self.bot.posting_queues.items()}
+        try:
+            for posting_queue in self.bot.posting_queues.values():
+                posting_queue.min_interval = max(posting_queue.min_interval, self.post_interval)
+                thread = threading.Thread(target=posting_queue.drain,
+                                          name=f"backfill-{posting_queue.account or 'default'}")
+                thread.start()
+                threads.append(thread)
+            for thread in threads:
+                thread.join()
+        finally:
+            for key, interval in intervals.items():
+                self.bot.posting_queues[key].min_interval = interval
+        pending = self.bot.database.pending_outbox_count()
+        if pending:
+            logging.info(f"{pending} posts are waiting for a retry; the bot will send them on its next run")
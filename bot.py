@@ -1,11 +1,18 @@
-from mastodon import Mastodon
 import time
-import schedule
 import logging
 from config import Config
 from database import Database
 from content_fetchers import ContentFetcher
+from async_engine import AsyncCheckEngine, Source, fetch_sequential
+from feeds import EVENT_FEED_KINDS, default_feed_config, load_feed_config
+from fingerprint import NearDuplicateIndex
+from poster import MastodonPool, PostingQueue
+from retention import RetentionManager
+from scheduler import AdaptiveInterval, CronSchedule, Job, Scheduler
+from templates import thread_parent_id
+import metrics
 from datetime import datetime
+from functools import partial
 import pytz
 
 # Set up logging
@@ -14,79 +21,258 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+MIN_SLEEP_SECONDS = 5
+# A weekly digest missed by less than this (bot down at the slot) is posted at startup
+WEEKLY_DIGEST_CATCH_UP = 12 * 3600
+
 class JyvaskylaBot:
-    def __init__(self):
+    def __init__(self, mode=None, database=None, content_fetcher=None, feed_config=None):
+        self.mode = mode or Config.ENGINE_MODE
+        if feed_config is None:
+            feed_config = load_feed_config(Config.FEEDS_FILE) if Config.FEEDS_FILE else default_feed_config()
+        self.feed_config = feed_config
+        self.database = database or Database()
+        self.content_fetcher = content_fetcher or ContentFetcher(self.database)
+        # Feeds are rendered untagged, so leave room for the longest hashtags an account appends
+        self.content_fetcher.templates.reserve_for(
+            hashtags for account in self.feed_config.accounts for hashtags in (account.hashtags, account.event_hashtags)
+        )
+        # A 304 would hide a feed's recent entries from accounts that just subscribed to it
+        self.forget_resubscribed_feeds()
+        self.engine = AsyncCheckEngine(Config.SOURCE_TIMEOUT)
+        self.near_duplicates = NearDuplicateIndex(self.database)
+        self.retention = RetentionManager(self.database)
+        self.mastodon_pool = MastodonPool()
         self.setup_mastodon()
-        self.database = Database()
-        self.content_fetcher = ContentFetcher(self.database)
+        self.metrics_server = None
+        self.scheduler = None
+        self.timezone = pytz.timezone('Europe/Helsinki')
         logging.info("Bot initialized successfully")
 
     def setup_mastodon(self):
-        self.mastodon = Mastodon(
-            access_token=Config.MASTODON_ACCESS_TOKEN,
-            api_base_url=Config.MASTODON_INSTANCE
-        )
-        logging.info(f"Connected to Mastodon instance: {Config.MASTODON_INSTANCE}")
+        """One posting queue per account, each draining its own part of the outbox."""
+        self.posting_queues = {}
+        for account in self.feed_config.accounts:
+            mastodon = self.mastodon_client(account)
+            self.posting_queues[account.key] = PostingQueue(mastodon, self.database, account=account.key)
+            logging.info(f"Connected {account.name} to Mastodon instance: {account.instance}")
+        # The first account's queue, for callers that only know one
+        self.posting_queue = self.posting_queues[self.feed_config.accounts[0].key]
 
-    def check_and_post_updates(self):
-        logging.info("Checking for new updates...")
+    def mastodon_client(self, account):
+        # Accounts on the same instance share one pooled session
+        return self.mastodon_pool.client(account.instance, account.access_token)
+
+    def source_for(self, feed):
+        """A Source fetching feed once, untagged and undeduplicated, for fan_out."""
+        fetcher = self.content_fetcher
+        if feed.kind == 'rss':
+            fetch = partial(fetcher.fetch_rss, feed.url, feed.name, hashtags='', dedup=False,
+                            is_posted=partial(self.posted_everywhere, feed))
+        elif feed.kind == 'facebook':
+            fetch = partial(fetcher.fetch_facebook, feed.page, feed.name, hashtags='', dedup=False)
+        elif feed.kind == 'events':
+            fetch = partial(fetcher.fetch_events, hashtags='', dedup=False)
+        else:
+            fetch = partial(fetcher.fetch_weekly_events, hashtags='', dedup=False)
+        return Source(feed.name, fetch, timeout=feed.timeout, feed=feed)
+
+    def feed_interval(self, feed):
+        """Minutes between runs of feed; 0 falls back to the per-kind setting, then CHECK_INTERVAL."""
+        defaults = {'rss': Config.RSS_INTERVAL, 'events': Config.EVENTS_INTERVAL, 'facebook': Config.FACEBOOK_INTERVAL}
+        return feed.interval or defaults.get(feed.kind) or Config.CHECK_INTERVAL
+
+    def build_sources(self, now):
+        sources = []
+        for feed in self.feed_config.active_feeds():
+            if feed.kind == 'weekly_events':
+                # Check if it's Monday to post weekly events
+                if now.weekday() != 0:  # 0 = Monday
+                    continue
+                logging.info("It's Monday - checking for weekly events...")
+            sources.append(self.source_for(feed))
+        return sources
+
+    def build_jobs(self):
+        """One scheduler job per feed, each with its own interval or cron slot."""
+        def source_job(source, **kwargs):
+            # Returns whether the run queued anything, for adaptive intervals
+            return Job(source.name, lambda: self.run_sources([source])['queued'] > 0, **kwargs)
+
+        jobs = []
+        for feed in self.feed_config.active_feeds():
+            source = self.source_for(feed)
+            if feed.kind == 'weekly_events':
+                jobs.append(source_job(
+                    source,
+                    cron=CronSchedule(feed.cron or Config.WEEKLY_DIGEST_CRON, self.timezone),
+                    catch_up=WEEKLY_DIGEST_CATCH_UP
+                ))
+                continue
+
+            interval = self.feed_interval(feed) * 60
+            kwargs = {}
+            if feed.kind == 'events':
+                # Runs early whenever an event reminder falls due
+                kwargs = {'next_due': self.content_fetcher.next_reminder_due, 'min_spacing': MIN_SLEEP_SECONDS}
+            elif Config.ADAPTIVE_POLLING:
+                # News feeds slow down while nothing new turns up
+                kwargs = {'adaptive': AdaptiveInterval(interval, Config.ADAPTIVE_MIN_FACTOR, Config.ADAPTIVE_MAX_FACTOR)}
+            jobs.append(source_job(
+                source,
+                interval=interval,
+                jitter=Config.SCHEDULE_JITTER,
+                run_at_start=True,
+                **kwargs
+            ))
+
+        if Config.RETENTION_INTERVAL_HOURS > 0:
+            jobs.append(Job(
+                'retention',
+                self.retention.run,
+                interval=Config.RETENTION_INTERVAL_HOURS * 3600,
+                jitter=Config.SCHEDULE_JITTER
+            ))
+        return jobs
+
+    def plan_posts(self, feed, items, record=True):
+        """Yield (account, posts) for every account subscribed to feed.
+
+        Each account tags the items with its own hashtags and deduplicates
+        them against its own post history. News items that are near-duplicates
+        of what the account recently queued from another feed are suppressed;
+        event reminders are left alone, since the 24h and 6h reminders of one
+        event are meant to look alike. With record=False nothing is written,
+        e.g. for a dry run.
+        """
+        for account in self.feed_config.subscribers(feed.name):
+            posts = [
+                (account.scoped_id(content_id),
+                 account.render(feed, content, reply=thread_parent_id(content_id) is not None),
+                 source)
+                for content_id, content, source in items
+            ]
+            unposted = self.database.filter_unposted(post[0] for post in posts)
+            metrics.inc('items_deduplicated_total', len(posts) - len(unposted), source=feed.name)
+            posts = [post for post in posts if post[0] in unposted]
+            if feed.kind not in EVENT_FEED_KINDS:
+                posts = self.near_duplicates.filter(account.key, posts, record=record)
+            yield account, posts
+
+    def fan_out(self, feed, items):
+        """Queue a feed's items for every subscribed account; returns how many were new.
 
-        # Check if it's Monday to post weekly events
-        now = datetime.now(pytz.timezone('Europe/Helsinki'))
+        A feed that reads the same as when its items were last queued, for
+        the same subscribers, is skipped without deduplicating it again.
+        """
+        state_key, state = self.feed_state(feed)
+        if state is not None and self.database.get_sync_state(state_key) == state:
+            logging.info(f"Feed {feed.name} has not changed")
+            self.content_fetcher.save_feed_validators(feed.name)
+            return 0
+
+        queued = 0
+        for account, posts in self.plan_posts(feed, items):
+            queued += self.posting_queues[account.key].enqueue(posts)
+        # Saved only now, so entries that never reached the outbox are tried again
+        if state is not None:
+            self.database.set_sync_state(state_key, state)
+        self.content_fetcher.save_feed_validators(feed.name)
+        if feed.kind == 'events':
+            self.content_fetcher.mark_reminders_queued(content_id for content_id, _, _ in items)
+        return queued
+
+    def feed_state(self, feed):
+        """(sync_state key, value) for what was just read from feed, or (None, None)."""
+        digest = self.content_fetcher.feed_digests.pop(feed.name, None)
+        if digest is None:
+            return None, None
+        return f"feed_digest:{feed.name}", f"{digest}:{self.subscriber_keys(feed)}"
+
+    def subscriber_keys(self, feed):
+        return ','.join(sorted(account.key for account in self.feed_config.subscribers(feed.name)))
+
+    def forget_resubscribed_feeds(self):
+        """Read feeds whose subscribers changed in full once, so new subscribers get their recent entries."""
+        for feed in self.feed_config.active_feeds():
+            state = self.database.get_sync_state(f"feed_digest:{feed.name}")
+            if feed.kind == 'rss' and state is not None and state.split(':', 1)[1] != self.subscriber_keys(feed):
+                self.content_fetcher.http.forget_validators(feed.url)
+
+    def posted_everywhere(self, feed, content_id):
+        """Whether every account subscribed to feed has already posted content_id."""
+        return all(self.database.is_posted(account.scoped_id(content_id))
+                   for account in self.feed_config.subscribers(feed.name))
+
+    def fetch_sources(self, sources, grouped=False):
+        if self.mode == 'sync':
+            return fetch_sequential(sources, grouped)
+        return self.engine.fetch_all(sources, grouped)
+
+    def fetch_updates(self):
+        now = datetime.now(self.timezone)
         logging.info(f"Current weekday: {now.strftime('%A')}")
+        return self.fetch_sources(self.build_sources(now))
+
+    def run_sources(self, sources, **extra):
+        """Fetch sources, queue what they found and log the cycle summary."""
+        started = time.monotonic()
+
+        # Counted per run: other jobs may be fetching at the same time
+        with metrics.run_scope() as run:
+            # Each source is fetched once and fanned out to its subscribers. Posting
+            # happens in the queues' worker threads, so fetching never waits on it
+            queued = 0
+            for source, items in self.fetch_sources(sources, grouped=True):
+                queued += self.fan_out(source.feed, items)
+            metrics.inc('cycles_total')
+
+        return metrics.log_cycle_summary(run, time.monotonic() - started, queued=queued,
+                                         posted_index=self.report_posted_index(), **extra)
+
+    def report_posted_index(self):
+        """Export the posted-id index's size and false-positive rates; returns them for the summary."""
+        stats = self.database.posted_index_stats()
+        metrics.set_gauge('posted_index_entries', stats['entries'])
+        metrics.set_gauge('posted_index_memory_bytes', stats['memory_bytes'])
+        metrics.set_gauge('posted_index_expected_fp_rate', stats['expected_fp_rate'])
+        metrics.set_gauge('posted_index_observed_fp_rate', stats['observed_fp_rate'])
+        return {
+            'entries': stats['entries'],
+            'mode': stats['mode'],
+            'expected_fp_rate': round(stats['expected_fp_rate'], 6),
+            'observed_fp_rate': round(stats['observed_fp_rate'], 6),
+        }
+
+    def check_and_post_updates(self, **extra):
+        """Run every source once, as a single cycle."""
+        logging.info("Checking for new updates...")
+        now = datetime.now(self.timezone)
+        return self.run_sources(self.build_sources(now), **extra)
+
+    def run_once(self, startup_s=None):
+        """Run one cycle, post everything that is due and return, e.g. from a systemd timer.
 
-        if now.weekday() == 0:  # 0 = Monday
-            logging.info("It's Monday - checking for weekly events...")
-            for content_id, content, event_type in self.content_fetcher.fetch_weekly_events():
-                try:
-                    self.mastodon.status_post(content)
-                    self.database.add_posted(content_id, event_type, content)
-                    logging.info(f"Posted weekly events summary with ID: {content_id}")
-                    time.sleep(5)
-                except Exception as e:
-                    logging.error(f"Error posting weekly events to Mastodon: {e}")
-
-        # Check events
-        for content_id, content, event_type in self.content_fetcher.fetch_events():
-            try:
-                self.mastodon.status_post(content)
-                self.database.add_posted(content_id, event_type, content)
-                logging.info(f"Posted new {event_type}: {content[:100]}...")
-                time.sleep(5)
-            except Exception as e:
-                logging.error(f"Error posting event to Mastodon: {e}")
-
-        # Check Jyväskylä website
-        for content_id, content in self.content_fetcher.fetch_jyvaskyla_website():
-            try:
-                self.mastodon.status_post(content)
-                self.database.add_posted(content_id, 'jyvaskyla_website', content)
-                logging.info(f"Posted new content from website: {content[:100]}...")
-                time.sleep(5)
-            except Exception as e:
-                logging.error(f"Error posting to Mastodon: {e}")
-
-        # Check Facebook
-        for content_id, content in self.content_fetcher.fetch_facebook_posts():
-            try:
-                self.mastodon.status_post(content)
-                self.database.add_posted(content_id, 'facebook', content)
-                logging.info(f"Posted new content from Facebook: {content[:100]}...")
-                time.sleep(5)
-            except Exception as e:
-                logging.error(f"Error posting to Mastodon: {e}")
+        Posts that fail are left in the outbox for the next run to retry.
+        """
+        logging.info(f"Running one cycle in {self.mode} mode")
+        extra = {} if startup_s is None else {'startup_s': round(startup_s, 3)}
+        summary = self.check_and_post_updates(**extra)
+        for posting_queue in self.posting_queues.values():
+            posting_queue.drain()
+        return summary
 
     def run(self):
-        logging.info(f"Starting bot with check interval of {Config.CHECK_INTERVAL} minutes")
+        logging.info(f"Starting bot in {self.mode} mode")
 
-        # Schedule checks
-        schedule.every(Config.CHECK_INTERVAL).minutes.do(self.check_and_post_updates)
+        if Config.METRICS_PORT:
+            self.metrics_server = metrics.MetricsServer(Config.METRICS_PORT).start()
 
-        # Initial check
-        logging.info("Performing initial check...")
-        self.check_and_post_updates()
+        for posting_queue in self.posting_queues.values():
+            posting_queue.start()
 
-        # Run continuously
-        while True:
-            schedule.run_pending()
-            time.sleep(60)
+        # Every job runs once at startup, then sleeps exactly until it is due again
+        self.scheduler = Scheduler()
+        for job in self.build_jobs():
+            self.scheduler.add(job)
+        self.scheduler.run_forever()
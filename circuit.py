@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+
+import metrics
+from config import Config
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+
+class CircuitBreaker:
+    """Stop calling a failing dependency for a while.
+
+    After failure_threshold failures in a row the circuit opens and allow()
+    says no for cooldown seconds. Then one trial call is let through: if it
+    succeeds the circuit closes, if it fails the circuit opens again.
+    """
+
+    def __init__(self, name, failure_threshold, cooldown, on_change=None):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.on_change = on_change
+        self.failures = 0
+        # Wall-clock time, so an open circuit can be restored after a restart
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def restore(self, failures, opened_at):
+        with self._lock:
+            self.failures = failures
+            self.opened_at = opened_at
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if self._trial else 'open'
+
+    def retry_in(self, now=None):
+        """Seconds until the next trial call, 0 when calls are allowed."""
+        if self.opened_at is None:
+            return 0
+        now = now if now is not None else time.time()
+        return max(0, self.opened_at + self.cooldown - now)
+
+    def allow(self, now=None):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial or self.retry_in(now) > 0:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            changed = self.failures or self.opened_at is not None
+            if self.opened_at is not None:
+                logging.info(f"Circuit {self.name} closed")
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+        if changed:
+            self._changed()
+
+    def record_failure(self, now=None):
+        with self._lock:
+            self.failures += 1
+            if self._trial or (self.opened_at is None and self.failures >= self.failure_threshold):
+                self.opened_at = now if now is not None else time.time()
+                self._trial = False
+                metrics.inc('circuit_opened_total', circuit=self.name)
+                logging.warning(f"Circuit {self.name} opened after {self.failures} failures, "
+                                f"skipping it for {self.cooldown:.0f}s")
+        self._changed()
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change(self)
+
+
+class CircuitRegistry:
+    """Named circuit breakers, e.g. one per upstream host.
+
+    With a database, every state change is saved and breakers are restored
+    on creation, so a host that was down stays skipped across restarts.
+    """
+
+    def __init__(self, database=None, failure_threshold=None, cooldown=None):
+        self.database = database
+        self.failure_threshold = failure_threshold if failure_threshold is not None else Config.HOST_FAILURE_THRESHOLD
+        self.cooldown = cooldown if cooldown is not None else Config.HOST_COOLDOWN_SECONDS
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, failure_threshold=None, cooldown=None):
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    name,
+                    failure_threshold if failure_threshold is not None else self.failure_threshold,
+                    cooldown if cooldown is not None else self.cooldown,
+                    on_change=self._save if self.database is not None else None
+                )
+                if self.database is not None:
+                    saved = self.database.get_circuit(name)
+                    if saved:
+                        breaker.restore(*saved)
+                        if saved[1] is not None:
+                            logging.info(f"Circuit {name} is open from an earlier run, "
+                                         f"next try in {breaker.retry_in():.0f}s")
+                self._breakers[name] = breaker
+            return breaker
+
+    def _save(self, breaker):
+        self.database.save_circuit(breaker.name, breaker.failures, breaker.opened_at)
@@ -6,4 +6,72 @@ load_dotenv()
 class Config:
     MASTODON_INSTANCE = os.getenv('MASTODON_INSTANCE')
     MASTODON_ACCESS_TOKEN = os.getenv('MASTODON_ACCESS_TOKEN')
-    CHECK_INTERVAL = int(os.getenv('CHECK_INTERVAL', 30)) 
\ No newline at end of file
+    # TOML file listing feeds and accounts; unset runs the single account above
+    FEEDS_FILE = os.getenv('FEEDS_FILE')
+    RSS_URL = os.getenv('RSS_URL', 'https://www.jyvaskyla.fi/term/103/rss.xml')
+    FACEBOOK_PAGE = os.getenv('FACEBOOK_PAGE', 'jyvaskyla')
+    HASHTAGS = os.getenv('HASHTAGS', '#Jyväskylä #Jkl #KeskiSuomi #Uutiset')
+    EVENT_HASHTAGS = os.getenv('EVENT_HASHTAGS', '#Jyväskylä #Jkl #Tapahtumat #KeskiSuomi')
+    CHECK_INTERVAL = int(os.getenv('CHECK_INTERVAL', 30))
+    # Per-source intervals in minutes; 0 falls back to CHECK_INTERVAL
+    RSS_INTERVAL = int(os.getenv('RSS_INTERVAL', 0))
+    EVENTS_INTERVAL = int(os.getenv('EVENTS_INTERVAL', 0))
+    FACEBOOK_INTERVAL = int(os.getenv('FACEBOOK_INTERVAL', 60))
+    WEEKLY_DIGEST_CRON = os.getenv('WEEKLY_DIGEST_CRON', '0 8 * * 1')
+    SCHEDULE_JITTER = float(os.getenv('SCHEDULE_JITTER', 30))
+    EVENT_DETAIL_WORKERS = int(os.getenv('EVENT_DETAIL_WORKERS', 8))
+    EVENT_DETAIL_PER_HOST = int(os.getenv('EVENT_DETAIL_PER_HOST', 4))
+    HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', 15))
+    HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', 3))
+    HTTP_BACKOFF = float(os.getenv('HTTP_BACKOFF', 1))
+    # A host failing this many requests in a row is skipped for HOST_COOLDOWN_SECONDS
+    HOST_FAILURE_THRESHOLD = int(os.getenv('HOST_FAILURE_THRESHOLD', 5))
+    HOST_COOLDOWN_SECONDS = float(os.getenv('HOST_COOLDOWN_SECONDS', 300))
+    # News feeds poll up to ADAPTIVE_MAX_FACTOR times slower while quiet, ADAPTIVE_MIN_FACTOR faster while busy
+    ADAPTIVE_POLLING = int(os.getenv('ADAPTIVE_POLLING', 1))
+    ADAPTIVE_MIN_FACTOR = float(os.getenv('ADAPTIVE_MIN_FACTOR', 0.5))
+    ADAPTIVE_MAX_FACTOR = float(os.getenv('ADAPTIVE_MAX_FACTOR', 4))
+    # --backfill --post sends at most one post per BACKFILL_POST_INTERVAL seconds per account
+    BACKFILL_POST_INTERVAL = float(os.getenv('BACKFILL_POST_INTERVAL', 30))
+    BACKFILL_FACEBOOK_PAGES = int(os.getenv('BACKFILL_FACEBOOK_PAGES', 5))
+    EVENT_CACHE_TTL_HOURS = float(os.getenv('EVENT_CACHE_TTL_HOURS', 24))
+    EVENT_CACHE_MEMORY_SIZE = int(os.getenv('EVENT_CACHE_MEMORY_SIZE', 1000))
+    EVENT_CACHE_MAX_ENTRIES = int(os.getenv('EVENT_CACHE_MAX_ENTRIES', 5000))
+    POSTED_INDEX_BLOOM_THRESHOLD = int(os.getenv('POSTED_INDEX_BLOOM_THRESHOLD', 200000))
+    POSTED_INDEX_FP_RATE = float(os.getenv('POSTED_INDEX_FP_RATE', 0.001))
+    ENGINE_MODE = os.getenv('ENGINE_MODE', 'async')
+    SOURCE_TIMEOUT = float(os.getenv('SOURCE_TIMEOUT', 120))
+    FACEBOOK_TIMEOUT = float(os.getenv('FACEBOOK_TIMEOUT', 180))
+    # The scraper runs in a child process that is killed after FACEBOOK_WORKER_TIMEOUT
+    # seconds and replaced every FACEBOOK_WORKER_MAX_RUNS pages; 0 MB means no memory cap
+    FACEBOOK_WORKER_TIMEOUT = float(os.getenv('FACEBOOK_WORKER_TIMEOUT', 150))
+    FACEBOOK_WORKER_MEMORY_MB = int(os.getenv('FACEBOOK_WORKER_MEMORY_MB', 1024))
+    FACEBOOK_WORKER_MAX_RUNS = int(os.getenv('FACEBOOK_WORKER_MAX_RUNS', 20))
+    FACEBOOK_FAILURE_THRESHOLD = int(os.getenv('FACEBOOK_FAILURE_THRESHOLD', 3))
+    FACEBOOK_COOLDOWN_MINUTES = float(os.getenv('FACEBOOK_COOLDOWN_MINUTES', 120))
+    # Mastodon's character limit; longer texts are shortened and weekly digests threaded
+    POST_MAX_CHARS = int(os.getenv('POST_MAX_CHARS', 500))
+    RENDER_CACHE_SIZE = int(os.getenv('RENDER_CACHE_SIZE', 2000))
+    POST_MIN_INTERVAL = float(os.getenv('POST_MIN_INTERVAL', 1))
+    POST_MAX_ATTEMPTS = int(os.getenv('POST_MAX_ATTEMPTS', 5))
+    POST_RETRY_BACKOFF = float(os.getenv('POST_RETRY_BACKOFF', 30))
+    EVENTS_API_PAGE_SIZE = int(os.getenv('EVENTS_API_PAGE_SIZE', 50))
+    EVENTS_API_MAX_PAGES = int(os.getenv('EVENTS_API_MAX_PAGES', 40))
+    EVENT_SYNC_DAYS = int(os.getenv('EVENT_SYNC_DAYS', 30))
+    EVENT_FULL_SYNC_HOURS = float(os.getenv('EVENT_FULL_SYNC_HOURS', 24))
+    # A reminder whose event page failed waits this many seconds, doubling per attempt
+    REMINDER_RETRY_BACKOFF = float(os.getenv('REMINDER_RETRY_BACKOFF', 60))
+    EVENT_SYNC_MIN_INTERVAL = float(os.getenv('EVENT_SYNC_MIN_INTERVAL', 60))
+    EVENT_EXTRACTOR = os.getenv('EVENT_EXTRACTOR', 'lxml-stream')
+    # SimHash bits two posts may differ in and still count as the same news; 0 hours disables
+    NEAR_DUPLICATE_DISTANCE = int(os.getenv('NEAR_DUPLICATE_DISTANCE', 3))
+    NEAR_DUPLICATE_WINDOW_HOURS = float(os.getenv('NEAR_DUPLICATE_WINDOW_HOURS', 72))
+    # Posts older than this many days are archived and kept only as ids; 0 keeps everything
+    RETENTION_DAYS = float(os.getenv('RETENTION_DAYS', 180))
+    RETENTION_SOURCE_DAYS = os.getenv('RETENTION_SOURCE_DAYS', 'event_24h=30,event_6h=30,weekly_events=30')
+    # Sources whose ids can never come back, so expired rows are deleted outright
+    RETENTION_DROP_SOURCES = os.getenv('RETENTION_DROP_SOURCES', 'event_24h,event_6h,weekly_events')
+    RETENTION_ARCHIVE_DIR = os.getenv('RETENTION_ARCHIVE_DIR', 'archive')
+    RETENTION_INTERVAL_HOURS = float(os.getenv('RETENTION_INTERVAL_HOURS', 24))
+    RETENTION_VACUUM_PAGES = int(os.getenv('RETENTION_VACUUM_PAGES', 2000))
+    METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
@@ -1,286 +1,482 @@
-import requests
-from bs4 import BeautifulSoup
 import hashlib
-from facebook_scraper import get_posts
-import feedparser
 from datetime import datetime, timedelta
 import pytz
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import metrics
+from config import Config
+from http_client import HttpClient
+from event_cache import EventDetailCache
+from events_api import EventsApiClient, parse_start_time
+from event_sync import EventSync
+from reminders import ReminderScheduler
+from extractors import BeautifulSoupExtractor, get_extractor
+from circuit import CircuitOpenError
+from facebook_worker import FacebookWorker
+from feed_reader import StreamingFeedReader
+from templates import PostRenderer, thread_part_id
 
 class ContentFetcher:
-    def __init__(self, database):
+    def __init__(self, database, http_client=None):
         self.database = database
-        self.hashtags = "#Jyväskylä #Jkl #KeskiSuomi #Uutiset"
-        self.event_hashtags = "#Jyväskylä #Jkl #Tapahtumat #KeskiSuomi"
+        self.http = http_client or HttpClient(database)
+        self.detail_cache = EventDetailCache(database)
+        self.extractor = get_extractor()
+        self.fallback_extractor = BeautifulSoupExtractor()
+        self.events_api = EventsApiClient(self.http)
+        self.facebook = FacebookWorker(breaker=self.http.circuits.get(
+            'facebook', Config.FACEBOOK_FAILURE_THRESHOLD, Config.FACEBOOK_COOLDOWN_MINUTES * 60
+        ))
+        self.hashtags = Config.HASHTAGS
+        self.event_hashtags = Config.EVENT_HASHTAGS
+        self.templates = PostRenderer()
         self.timezone = pytz.timezone('Europe/Helsinki')
+        self.reminders = ReminderScheduler(database)
+        self.event_sync = EventSync(database, self.events_api, self.timezone, self.reminders)
         self.enable_event_notifications = False
+        self.detail_workers = Config.EVENT_DETAIL_WORKERS
+        self.detail_per_host = Config.EVENT_DETAIL_PER_HOST
+        self._host_semaphores = {}
+        self._host_semaphores_lock = threading.Lock()
+        # Feeds seen listing an older entry before a newer one are always read to the end
+        self._unsorted_feeds = set()
+        # Hash of what was read from each feed, by source, until the caller commits it
+        self.feed_digests = {}
+        # (url, etag, last_modified) of each feed's last read, saved by the caller with its digest
+        self.feed_validators = {}
 
     def fetch_jyvaskyla_website(self):
-        try:
-            url = "https://www.jyvaskyla.fi/term/103/rss.xml"
-            feed = feedparser.parse(url)
+        return self.fetch_rss(Config.RSS_URL, 'jyvaskyla_website')
 
-            content_list = []
-            for entry in feed.entries:
-                # Parse the published date
-                published = datetime(*entry.published_parsed[:6])
-                # Only include entries from the last 24 hours
-                if datetime.now() - published < timedelta(hours=24):
-                    title = entry.title
+    def fetch_rss(self, url, source, hashtags=None, dedup=True, since=None, until=None, is_posted=None):
+        """New entries from the last 24 hours of an RSS feed, or published in [since, until).
+
+        hashtags defaults to the fetcher's own; pass '' and dedup=False to get
+        untagged items for callers that tag and deduplicate per account.
+        is_posted(content_id) tells whether an entry was already posted, so
+        reading can stop there; with dedup it is the fetcher's own history.
+        """
+        try:
+            # Only include entries from the last 24 hours unless a window was given
+            cutoff = since if since is not None else datetime.now() - timedelta(hours=24)
+            stop_at = is_posted or (self.database.is_posted if dedup else None)
+            # A window is replayed in full, so only regular polls ask whether the feed changed
+            entries = self._read_feed(url, source, cutoff, until, is_posted=stop_at, conditional=since is None)
+
+            candidates = []
+            for entry in entries:
+                if self._in_window(entry.published, since, until):
                     link = entry.link
                     content_id = hashlib.md5(link.encode()).hexdigest()
-
-                    if not self.database.is_posted(content_id):
-                        content = f"{title}\n{link}\n\n{self.hashtags}"
-                        content_list.append((content_id, content))
-
-            return content_list
+                    tags = self.hashtags if hashtags is None else hashtags
+                    content = self.templates.render('news', {'title': entry.title, 'link': link}, tags, key=content_id)
+                    candidates.append((content_id, self._tagged(content, tags)))
+
+            return self._unposted(candidates, source) if dedup else candidates
+        except CircuitOpenError as e:
+            logging.info(f"Skipping RSS feed {url}: {e}")
+            self._forget_feed_read(source)
+            return []
         except Exception as e:
-            print(f"Error fetching Jyväskylä RSS feed: {e}")
+            print(f"Error fetching RSS feed {url}: {e}")
+            # The feed must not count as seen when its entries were not returned
+            self._forget_feed_read(source)
             return []
 
     def fetch_facebook_posts(self):
+        return self.fetch_facebook(Config.FACEBOOK_PAGE, 'facebook')
+
+    def fetch_facebook(self, page, source, hashtags=None, dedup=True, since=None, until=None, pages=1):
         try:
-            content_list = []
-            for post in get_posts('jyvaskyla', pages=1):
-                # Only include posts from the last 24 hours
-                if datetime.now() - post['time'] < timedelta(hours=24):
+            candidates = []
+            # Scraped in a separate process, so a hung or bloated scraper cannot stall the bot
+            for post in self.facebook.get_posts(page, pages=pages):
+                # Only include posts from the last 24 hours unless a window was given
+                if self._in_window(post['time'], since, until):
                     content_id = post['post_id']
-                    if not self.database.is_posted(content_id):
-                        content = f"{post['text'][:400]}...\n\n{self.hashtags}"
-                        content_list.append((content_id, content))
-            return content_list
+                    tags = self.hashtags if hashtags is None else hashtags
+                    content = self.templates.render('facebook', {'text': post['text']}, tags, key=content_id)
+                    candidates.append((content_id, self._tagged(content, tags)))
+
+            return self._unposted(candidates, source) if dedup else candidates
+        except CircuitOpenError as e:
+            logging.info(f"Skipping Facebook page {page}: {e}")
+            return []
         except Exception as e:
-            print(f"Error fetching Facebook posts: {e}")
+            print(f"Error fetching Facebook posts from {page}: {e}")
             return []
 
+    def _read_feed(self, url, source, cutoff=None, until=None, is_posted=None, conditional=False):
+        """Entries of the feed at url published from cutoff until until, newest first.
+
+        The body is parsed as it streams in. While the feed lists its
+        entries newest first, reading stops at the first entry older than
+        cutoff or for which is_posted(content_id) is true, and the rest is
+        never downloaded. The hash of the part that was read is left in
+        feed_digests[source], and with conditional the feed's HTTP
+        validators in feed_validators[source]. The bot saves both only once
+        the entries are queued, so a failed run cannot hide them; until then
+        the feed is downloaded in full, and afterwards an unchanged feed
+        costs a 304 and returns no entries.
+        """
+        self._forget_feed_read(source)
+        response = self.http.get(url, stream=True, conditional=conditional, save_validators=False)
+        try:
+            response.raise_for_status()
+            if response.not_modified:
+                return []
+            reader = StreamingFeedReader(response.iter_content())
+            sorted_feed = url not in self._unsorted_feeds
+            entries = []
+            for entry in reader:
+                if entry.published is None:
+                    if cutoff is None:
+                        entries.append(entry)
+                    continue
+                if sorted_feed and reader.in_order:
+                    if cutoff is not None and entry.published < cutoff:
+                        break
+                    if is_posted is not None and is_posted(hashlib.md5(entry.link.encode()).hexdigest()):
+                        break
+                if (cutoff is None or cutoff <= entry.published) and (until is None or entry.published < until):
+                    entries.append(entry)
+        finally:
+            response.close()
+
+        metrics.inc('feed_entries_read_total', reader.entries_read, source=source)
+        if not reader.in_order and sorted_feed:
+            logging.info(f"Feed {url} does not list its newest entries first, reading all of it from now on")
+            self._unsorted_feeds.add(url)
+
+        self.feed_digests[source] = reader.digest
+        if response.validators:
+            self.feed_validators[source] = (response.url, *response.validators)
+        entries.sort(key=lambda entry: entry.published or datetime.min, reverse=True)
+        return entries
+
+    def save_feed_validators(self, source):
+        """Store the HTTP validators of source's last read, once its entries are queued."""
+        validators = self.feed_validators.pop(source, None)
+        if validators is not None:
+            self.http.save_validators(*validators)
+
+    def _forget_feed_read(self, source):
+        self.feed_digests.pop(source, None)
+        self.feed_validators.pop(source, None)
+
+    def _unposted(self, candidates, source):
+        unposted = self.database.filter_unposted(c[0] for c in candidates)
+        metrics.inc('items_deduplicated_total', len(candidates) - len(unposted), source=source)
+        return [c for c in candidates if c[0] in unposted]
+
+    @staticmethod
+    def _in_window(published, since=None, until=None):
+        if since is None:
+            return datetime.now() - published < timedelta(hours=24)
+        return since <= published and (until is None or published < until)
+
+    @staticmethod
+    def _tagged(text, hashtags):
+        return f"{text}\n\n{hashtags}" if hashtags else text
+
     def fetch_test_feed(self):
         try:
             # Use a frequently updating news RSS feed for testing
             url = "https://feeds.yle.fi/uutiset/v1/recent.rss?publisherIds=YLE_UUTISET"
-            feed = feedparser.parse(url)
 
-            content_list = []
-            for entry in feed.entries:
-                title = entry.title
+            candidates = []
+            for entry in self._read_feed(url, 'test_feed', is_posted=self.database.is_posted):
                 link = entry.link
                 content_id = hashlib.md5(link.encode()).hexdigest()
+                content = self.templates.render('test', {'title': entry.title, 'link': link}, key=content_id)
+                candidates.append((content_id, content))
 
-                if not self.database.is_posted(content_id):
-                    content = f"TEST: {title}\n\n{link}\n\n#Test"
-                    content_list.append((content_id, content))
-
-            return content_list
+            return self._unposted(candidates, 'test_feed')
         except Exception as e:
             print(f"Error fetching test feed: {e}")
             return []
 
-    def fetch_events(self, start_date=None, end_date=None):
+    def fetch_events(self, start_date=None, end_date=None, hashtags=None, dedup=True):
         try:
-            url = "https://keskisuomievents.fi/api/items/event"
-            now = datetime.now(self.timezone)
+            # Only handle reminders if enabled
+            if not self.enable_event_notifications:
+                return []
 
-            if start_date is None:
-                start = 'now'
-                end = (now + timedelta(days=30)).strftime('%Y-%m-%d')
-            else:
-                start = start_date.strftime('%Y-%m-%d')
-                end = end_date.strftime('%Y-%m-%d')
-
-            params = {
-                'start': start,
-                'end': end,
-                'limit': 100,
-                'sort': 'start_time',
-                'filter[start_time][_gte]': start,
-                'filter[end_time][_gte]': start
-            }
-
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            events_list = response.json()
+            if start_date is not None:
+                self.event_sync.sync_range(start_date, end_date)
+            self._sync_events()
 
-            content_list = []
+            # Reminders were scheduled by due time when the events were synced
+            candidates = self.reminders.due()
 
-            for event in events_list.get('data', []):
-                try:
-                    event_url = f"https://kalenteri.jyvaskyla.fi/fi/tapahtuma/{event['id']}"
+            if dedup:
+                unposted = self._unposted(candidates, 'events')
+                kept = {c[0] for c in unposted}
+                self.reminders.mark_queued(c[0] for c in candidates if c[0] not in kept)
+                candidates = unposted
+            return self._reminder_posts(candidates, hashtags)
+        except Exception as e:
+            logging.error(f"Error fetching events from API: {e}")
+            return []
 
-                    details = self.fetch_event_details(event_url)
-                    if not details:
-                        continue
+    def fetch_reminders_between(self, start, end, hashtags=None, upcoming_only=True, retry_failed=True):
+        """Reminder posts that fall due in [start, end), for backfills.
 
-                    start_time = datetime.fromisoformat(event['start_time'].replace('Z', '+00:00')).astimezone(self.timezone)
-                    content_id = hashlib.md5(f"{event['id']}".encode()).hexdigest()
-
-                    description = details['description']
-                    if description:
-                        description = description[:400] + "..." if len(description) > 400 else description
-
-                    # Check for upcoming notifications
-                    time_until_event = start_time - now
-
-                    # Only handle reminders if enabled
-                    if not self.enable_event_notifications:
-                        return []
-
-                    # Only handle reminders, not new events
-                    if timedelta(hours=23) < time_until_event <= timedelta(hours=24):
-                        reminder_id = hashlib.md5(f"{content_id}_24h".encode()).hexdigest()
-                        if not self.database.is_posted(reminder_id):
-                            content = (
-                                f"Tapahtuma alkaa huomenna:\n\n"
-                                f"{details['title']}\n"
-                                f"{start_time.strftime('%d.%m.%Y klo %H:%M')}\n\n"
-                                f"{description}\n\n"
-                                f"{event_url}\n\n"
-                                f"{self.event_hashtags}"
-                            )
-                            content_list.append((reminder_id, content, 'event_24h'))
-
-                    elif timedelta(hours=5) < time_until_event <= timedelta(hours=6):
-                        reminder_id = hashlib.md5(f"{content_id}_6h".encode()).hexdigest()
-                        if not self.database.is_posted(reminder_id):
-                            content = (
-                                f"Tapahtuma alkaa pian:\n\n"
-                                f"{details['title']}\n"
-                                f"{start_time.strftime('%d.%m.%Y klo %H:%M')}\n\n"
-                                f"{description}\n\n"
-                                f"{event_url}\n\n"
-                                f"{self.event_hashtags}"
-                            )
-                            content_list.append((reminder_id, content, 'event_6h'))
-
-                except Exception as e:
-                    logging.error(f"Error processing event {event.get('id', 'unknown')}: {e}")
+        Unlike fetch_events this ignores whether a reminder was already sent
+        or missed, and leaves dedup to the caller. With upcoming_only, events
+        that have already started are skipped.
+        """
+        if not self.enable_event_notifications:
+            return []
+        candidates = self.reminders.between(start.timestamp(), end.timestamp())
+        if upcoming_only:
+            now = time.time()
+            candidates = [c for c in candidates if c[3] > now]
+        return self._reminder_posts(candidates, hashtags, retry_failed)
+
+    def mark_reminders_queued(self, reminder_ids):
+        """Record that reminder posts reached the outbox, so they are not due again."""
+        self.reminders.mark_queued(reminder_ids)
+
+    def _reminder_posts(self, candidates, hashtags=None, retry_failed=True):
+        """Render (reminder_id, event_id, reminder_type, start_ts) rows into posts.
+
+        The posts' content ids are the reminder ids. They are only marked
+        queued by the caller once the posts are in the outbox, so a run that
+        times out or fails before that leaves them due.
+        """
+        event_urls = [f"https://kalenteri.jyvaskyla.fi/fi/tapahtuma/{c[1]}" for c in candidates]
+        all_details = self.fetch_event_details_many(event_urls)
+
+        content_list = []
+        failed = []
+
+        for (reminder_id, event_id, event_type, start_ts), event_url, details in zip(candidates, event_urls, all_details):
+            try:
+                if not details:
+                    failed.append(reminder_id)
                     continue
 
-            return content_list
+                start_time = datetime.fromtimestamp(start_ts, self.timezone)
+                tags = self.event_hashtags if hashtags is None else hashtags
+                content = self.templates.render(event_type, {
+                    'title': details['title'],
+                    'time': start_time.strftime('%d.%m.%Y klo %H:%M'),
+                    'description': details['description'] or '',
+                    'url': event_url,
+                }, tags, key=event_id)
+                content_list.append((reminder_id, self._tagged(content, tags), event_type))
+
+            except Exception as e:
+                logging.error(f"Error processing event {event_id}: {e}")
+                failed.append(reminder_id)
+                continue
+
+        if failed and retry_failed:
+            # Otherwise the reminders stay due and the events job reruns every few seconds
+            self.reminders.retry_later(failed)
+        return content_list
+
+    def next_reminder_due(self):
+        """Timestamp of the next scheduled reminder, or None if reminders are off."""
+        if not self.enable_event_notifications:
+            return None
+        return self.reminders.next_due()
+
+    def _sync_events(self):
+        # A failed sync leaves the last known events in place, so reminders
+        # and digests are still computed from the store
+        try:
+            self.event_sync.sync()
         except Exception as e:
-            logging.error(f"Error fetching events from API: {e}")
-            return []
+            logging.error(f"Error syncing events from API: {e}")
+
+    def fetch_event_details_many(self, event_urls):
+        """Fetch details for many event pages concurrently.
+
+        Results are returned in the same order as event_urls; a failed page
+        yields None, just like fetch_event_details.
+        """
+        return [details for _, details in self.iter_event_details(event_urls, lambda event_url: event_url)]
+
+    def iter_event_details(self, items, url_for):
+        """Yield (item, details) pairs in the order of items.
+
+        items may be a generator: each detail page is submitted to the worker
+        pool as soon as its item arrives, so fetching overlaps with whatever
+        produces the items (e.g. later API pages).
+        """
+        with ThreadPoolExecutor(max_workers=max(1, self.detail_workers), thread_name_prefix='event-details') as executor:
+            futures = [
+                (item, metrics.submit_in_context(executor, self._fetch_event_details_limited, url_for(item)))
+                for item in items
+            ]
+            for item, future in futures:
+                yield item, future.result()
+
+    def _fetch_event_details_limited(self, event_url):
+        with self._host_semaphore(event_url):
+            return self.fetch_event_details(event_url)
+
+    def _host_semaphore(self, url):
+        host = urlparse(url).netloc
+        with self._host_semaphores_lock:
+            if host not in self._host_semaphores:
+                self._host_semaphores[host] = threading.BoundedSemaphore(max(1, self.detail_per_host))
+            return self._host_semaphores[host]
 
     def fetch_event_details(self, event_url):
+        event_id = event_url.rstrip('/').rsplit('/', 1)[-1]
+        cached = self.detail_cache.get(event_id)
+        if cached and cached[2]:
+            return cached[0]
+
+        response = None
         try:
-            response = requests.get(event_url)
+            streaming = self.extractor.streaming
+            response = self.http.get(event_url, conditional=True, cache_body=False, stream=streaming)
+            if response.not_modified and not cached:
+                # Validators outlived the cached details, so fetch the page again
+                response = self.http.get(event_url, stream=streaming)
             response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
 
-            # Find the event title (try multiple approaches)
-            title = None
-            title_elem = soup.find('h1', class_='event-title')
-            if title_elem:
-                title = title_elem.text.strip()
-            else:
-                meta_title = soup.find('meta', property='og:title')
-                if meta_title:
-                    title = meta_title.get('content', '').strip()
-
-            if not title:
-                logging.warning(f"Could not find title for event at {event_url}")
-                return None
-
-            # Find the event description (try multiple approaches)
-            description = None
-            desc_elem = soup.find('div', class_='event-description')
-            if desc_elem:
-                description = desc_elem.text.strip()
+            if response.not_modified:
+                self.detail_cache.touch(event_id)
+                return cached[0]
+
+            if streaming:
+                # Only the part of the page the extractor read is hashed
+                details, content_hash = self._extract_streaming(response, event_url)
+                if cached and cached[1] == content_hash:
+                    self.detail_cache.touch(event_id)
+                    return cached[0]
             else:
-                meta_desc = soup.find('meta', property='og:description')
-                if meta_desc:
-                    description = meta_desc.get('content', '').strip()
-                else:
-                    short_desc = soup.find('div', class_='event-short-description')
-                    if short_desc:
-                        description = short_desc.text.strip()
+                # Unchanged page: reuse the parsed details and restart their TTL
+                content_hash = hashlib.md5(response.content).hexdigest()
+                if cached and cached[1] == content_hash:
+                    self.detail_cache.touch(event_id)
+                    return cached[0]
+                details = self._extract(self.extractor, [response.content], event_url)
+
+            if details:
+                logging.info(f"Found event: {details['title']}")
+                self.detail_cache.put(event_id, details, content_hash)
+            return details
+
+        except CircuitOpenError:
+            # The host is down: serve what we had, however old, without a request
+            return cached[0] if cached else None
+        except Exception as e:
+            logging.error(f"Error fetching event details from {event_url}: {e}")
+            return None
+        finally:
+            if response is not None:
+                response.close()
 
-            logging.info(f"Found event: {title}")
+    def _extract_streaming(self, response, event_url):
+        hasher = hashlib.md5()
+        consumed = []
+        body = response.iter_content()
 
-            return {
-                'title': title,
-                'description': description or '',
-                'short_description': description or '',
-                'location': '',
-                'start_time': ''
-            }
+        def chunks():
+            for chunk in body:
+                hasher.update(chunk)
+                consumed.append(chunk)
+                yield chunk
 
+        try:
+            details = self.extractor.extract(chunks(), event_url)
         except Exception as e:
-            logging.error(f"Error fetching event details from {event_url}: {e}")
-            return None
+            # Fall back to BeautifulSoup on the whole page
+            logging.warning(f"{self.extractor.name} extractor failed for {event_url}, using bs4: {e}")
+            details = self.fallback_extractor.extract(consumed + list(chunks()), event_url)
+        return details, hasher.hexdigest()
 
-    def fetch_weekly_events(self):
+    def _extract(self, extractor, chunks, event_url):
         try:
-            url = "https://keskisuomievents.fi/api/items/event"
-            now = datetime.now(self.timezone)
+            return extractor.extract(chunks, event_url)
+        except Exception as e:
+            if extractor is self.fallback_extractor:
+                raise
+            logging.warning(f"{extractor.name} extractor failed for {event_url}, using bs4: {e}")
+            return self.fallback_extractor.extract(chunks, event_url)
+
+    def fetch_weekly_events(self, hashtags=None, dedup=True, week_start=None):
+        """The digest of events from now (or week_start) to the end of that week.
+
+        With week_start the caller is expected to have synced that range.
+        """
+        try:
+            now = week_start or datetime.now(self.timezone)
 
             # Calculate end of week (Sunday)
             days_until_sunday = (6 - now.weekday()) % 7
             week_end = now + timedelta(days=days_until_sunday)
 
-            params = {
-                'start': now.strftime('%Y-%m-%d'),
-                'end': week_end.strftime('%Y-%m-%d'),
-                'limit': 100,
-                'sort': 'start_time',
-                'filter[start_time][_gte]': now.strftime('%Y-%m-%d'),
-                'filter[end_time][_gte]': now.strftime('%Y-%m-%d')  # Match test implementation
-            }
-
             logging.info(f"Fetching weekly events from {now.strftime('%Y-%m-%d')} to {week_end.strftime('%Y-%m-%d')}")
 
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            events_list = response.json()
+            if week_start is None:
+                self._sync_events()
+            events = self.event_sync.events_between(now, week_end)
+            event_count = len(events)
 
-            event_count = len(events_list.get('data', []))
-            logging.info(f"Found {event_count} events in API response")
+            def week_events():
+                for event in events:
+                    try:
+                        start_time = parse_start_time(event, self.timezone)
 
-            if event_count == 0:
-                logging.warning("No events returned from API")
-                return []
+                        logging.info(f"Processing event {event['id']} starting at {start_time}")
+
+                        if now <= start_time < week_end:  # Match test implementation's date check
+                            yield event, start_time
+
+                    except Exception as e:
+                        logging.error(f"Error processing event {event.get('id', 'unknown')}: {e}")
+                        continue
 
             content_list = []
             events_text = []
             seen_events = set()
 
-            for event in events_list.get('data', []):
-                try:
-                    event_url = f"https://kalenteri.jyvaskyla.fi/fi/tapahtuma/{event['id']}"
-                    start_time = datetime.fromisoformat(event['start_time'].replace('Z', '+00:00')).astimezone(self.timezone)
-
-                    logging.info(f"Processing event {event['id']} starting at {start_time}")
-
-                    if now <= start_time < week_end:  # Match test implementation's date check
-                        details = self.fetch_event_details(event_url)
-                        if details and details['title']:
-                            event_key = f"{details['title']}_{start_time.strftime('%Y%m%d%H%M')}"
-
-                            if event_key not in seen_events:
-                                seen_events.add(event_key)
-                                events_text.append(
-                                    f"- {details['title']}, {start_time.strftime('%d.%m.%Y klo %H:%M')}"
-                                )
-                                logging.info(f"Added event: {details['title']} at {start_time}")
-                        else:
-                            logging.warning(f"Could not fetch details for event {event['id']}")
-
-                except Exception as e:
-                    logging.error(f"Error processing event {event.get('id', 'unknown')}: {e}")
-                    continue
+            week_details = self.iter_event_details(
+                week_events(), lambda item: f"https://kalenteri.jyvaskyla.fi/fi/tapahtuma/{item[0]['id']}"
+            )
+            for (event, start_time), details in week_details:
+                if details and details['title']:
+                    event_key = f"{details['title']}_{start_time.strftime('%Y%m%d%H%M')}"
+
+                    if event_key not in seen_events:
+                        seen_events.add(event_key)
+                        events_text.append(self.templates.render('weekly_event', {
+                            'title': details['title'],
+                            'time': start_time.strftime('%d.%m.%Y klo %H:%M'),
+                        }, key=event['id'], budget=self.templates.limit))
+                        logging.info(f"Added event: {details['title']} at {start_time}")
+                else:
+                    logging.warning(f"Could not fetch details for event {event['id']}")
+
+            logging.info(f"Found {event_count} events in the local event store")
+
+            if event_count == 0:
+                logging.warning("No events found in the local event store")
+                return []
 
             logging.info(f"Processed {len(events_text)} valid events for the week")
 
             if events_text:
                 content_id = hashlib.md5(f"weekly_{now.strftime('%Y-%W')}".encode()).hexdigest()
-                if not self.database.is_posted(content_id):
-                    content = (
-                        "Tämän viikon tapahtumat:\n\n"
-                        f"{chr(10).join(events_text)}\n\n"
-                        "https://kalenteri.jyvaskyla.fi\n\n"
-                        f"{self.event_hashtags}"
-                    )
-                    content_list.append((content_id, content, 'weekly_events'))
-                    logging.info(f"Created weekly events post with ID: {content_id}")
+                if not dedup or not self.database.is_posted(content_id):
+                    # Too many events for one post continue in replies to it
+                    tags = self.event_hashtags if hashtags is None else hashtags
+                    posts = self.templates.render_thread('weekly', 'weekly_more', events_text, hashtags=tags)
+                    for part, content in enumerate(posts, start=1):
+                        if part == 1:
+                            content = self._tagged(content, tags)
+                        content_list.append((thread_part_id(content_id, part), content, 'weekly_events'))
+                    logging.info(f"Created weekly events post with ID: {content_id} in {len(posts)} parts")
                 else:
                     logging.info(f"Weekly events already posted for week {now.strftime('%Y-%W')}")
             else:
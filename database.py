@@ -1,31 +1,520 @@
+import json
+import os
 import sqlite3
+import threading
+import logging
+import time
 from datetime import datetime
+import metrics
+from config import Config
+from posted_index import PostedIndex
+
+# Stay well below SQLITE_MAX_VARIABLE_NUMBER on older SQLite builds
+MAX_QUERY_PARAMS = 500
 
 class Database:
     def __init__(self, db_file="posted_content.db"):
         self.db_file = db_file
+        # One long-lived connection shared by the bot and the fetcher threads,
+        # serialized by a lock. sqlite3 caches the prepared statements per connection.
+        self.conn = sqlite3.connect(db_file, check_same_thread=False, cached_statements=256)
+        self._lock = threading.RLock()
+        self.configure_connection()
         self.init_db()
+        self.posted_index = PostedIndex(Config.POSTED_INDEX_BLOOM_THRESHOLD, Config.POSTED_INDEX_FP_RATE)
+        self.load_posted_index()
+
+    def configure_connection(self):
+        with self._lock:
+            c = self.conn.cursor()
+            # Only takes effect on a new database; RetentionManager converts old ones
+            c.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            c.execute('PRAGMA journal_mode=WAL')
+            c.execute('PRAGMA synchronous=NORMAL')
+            c.execute('PRAGMA temp_store=MEMORY')
+            c.execute('PRAGMA busy_timeout=5000')
+            c.execute('PRAGMA cache_size=-8000')
 
     def init_db(self):
-        with sqlite3.connect(self.db_file) as conn:
-            c = conn.cursor()
+        with self._lock, self.conn:
+            c = self.conn.cursor()
             c.execute('''CREATE TABLE IF NOT EXISTS posted_content
-                        (content_id TEXT PRIMARY KEY, 
-                         source TEXT, 
+                        (content_id TEXT PRIMARY KEY,
+                         source TEXT,
                          content TEXT,
                          posted_date TIMESTAMP)''')
-            conn.commit()
+            c.execute('CREATE INDEX IF NOT EXISTS idx_posted_content_date ON posted_content (posted_date)')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_posted_content_source ON posted_content (source, posted_date)')
+            c.execute('''CREATE TABLE IF NOT EXISTS http_validators
+                        (url TEXT PRIMARY KEY,
+                         etag TEXT,
+                         last_modified TEXT,
+                         body BLOB,
+                         updated_date TIMESTAMP)''')
+            c.execute('''CREATE TABLE IF NOT EXISTS event_details
+                        (event_id TEXT PRIMARY KEY,
+                         details TEXT,
+                         content_hash TEXT,
+                         fetched_at REAL)''')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_event_details_fetched_at ON event_details (fetched_at)')
+            c.execute('''CREATE TABLE IF NOT EXISTS outbox
+                        (content_id TEXT PRIMARY KEY,
+                         source TEXT,
+                         content TEXT,
+                         status TEXT DEFAULT 'pending',
+                         attempts INTEGER DEFAULT 0,
+                         next_attempt_at REAL,
+                         status_id TEXT,
+                         last_error TEXT,
+                         created_at REAL)''')
+            # Outboxes created before multi-account support lack the account column;
+            # their rows belong to the primary account, whose key is ''
+            columns = {row[1] for row in c.execute('PRAGMA table_info(outbox)')}
+            if 'account' not in columns:
+                c.execute("ALTER TABLE outbox ADD COLUMN account TEXT NOT NULL DEFAULT ''")
+            c.execute('CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox (status, next_attempt_at)')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_outbox_account ON outbox (account, status, next_attempt_at)')
+            c.execute('''CREATE TABLE IF NOT EXISTS events
+                        (event_id TEXT PRIMARY KEY,
+                         start_ts REAL,
+                         data TEXT,
+                         content_hash TEXT,
+                         synced_at REAL)''')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_events_start_ts ON events (start_ts)')
+            c.execute('''CREATE TABLE IF NOT EXISTS reminders
+                        (reminder_id TEXT PRIMARY KEY,
+                         event_id TEXT,
+                         reminder_type TEXT,
+                         due_ts REAL,
+                         expire_ts REAL,
+                         start_ts REAL,
+                         status TEXT DEFAULT 'pending')''')
+            # Reminders created before retries were tracked lack these columns
+            columns = {row[1] for row in c.execute('PRAGMA table_info(reminders)')}
+            if 'attempts' not in columns:
+                c.execute('ALTER TABLE reminders ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0')
+            if 'retry_at' not in columns:
+                c.execute('ALTER TABLE reminders ADD COLUMN retry_at REAL')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_reminders_due ON reminders (status, due_ts)')
+            c.execute('''CREATE TABLE IF NOT EXISTS fingerprints
+                        (content_id TEXT,
+                         kind TEXT,
+                         account TEXT,
+                         simhash INTEGER,
+                         source TEXT,
+                         created_at REAL,
+                         PRIMARY KEY (content_id, kind))''')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_fingerprints_created_at ON fingerprints (created_at)')
+            c.execute('''CREATE TABLE IF NOT EXISTS fingerprint_buckets
+                        (account TEXT,
+                         kind TEXT,
+                         bucket INTEGER,
+                         content_id TEXT)''')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_fingerprint_buckets ON fingerprint_buckets (account, kind, bucket)')
+            c.execute('''CREATE TABLE IF NOT EXISTS circuit_breakers
+                        (name TEXT PRIMARY KEY,
+                         failures INTEGER,
+                         opened_at REAL)''')
+            c.execute('''CREATE TABLE IF NOT EXISTS sync_state
+                        (key TEXT PRIMARY KEY,
+                         value TEXT)''')
+
+    def load_posted_index(self):
+        with self._lock:
+            c = self.conn.execute('SELECT content_id FROM posted_content')
+            self.posted_index.load(row[0] for row in c)
+        stats = self.posted_index.stats()
+        logging.info(
+            f"Loaded {stats['entries']} posted ids into {stats['mode']} index "
+            f"({stats['memory_bytes'] / 1024:.1f} KiB, expected false-positive rate {stats['expected_fp_rate']:.4%})"
+        )
 
+    def posted_index_stats(self):
+        return self.posted_index.stats()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    @metrics.timed_method('db_operation')
     def is_posted(self, content_id):
-        with sqlite3.connect(self.db_file) as conn:
-            c = conn.cursor()
-            c.execute('SELECT 1 FROM posted_content WHERE content_id = ?', (content_id,))
-            return c.fetchone() is not None
+        with self._lock:
+            # Negative answers from the index are exact and need no I/O
+            if not self.posted_index.might_contain(content_id):
+                return False
+            if self.posted_index.exact:
+                return True
+            c = self.conn.execute('SELECT 1 FROM posted_content WHERE content_id = ?', (content_id,))
+            found = c.fetchone() is not None
+            self.posted_index.record_fallback(found)
+            return found
+
+    @metrics.timed_method('db_operation')
+    def filter_unposted(self, content_ids):
+        """Return the subset of content_ids that has not been posted yet."""
+        with self._lock:
+            unposted = set()
+            maybe_posted = []
+            for content_id in set(content_ids):
+                if not self.posted_index.might_contain(content_id):
+                    unposted.add(content_id)
+                elif not self.posted_index.exact:
+                    maybe_posted.append(content_id)
 
+            # Bloom filter hits are confirmed against the table
+            for i in range(0, len(maybe_posted), MAX_QUERY_PARAMS):
+                chunk = maybe_posted[i:i + MAX_QUERY_PARAMS]
+                placeholders = ','.join('?' * len(chunk))
+                c = self.conn.execute(
+                    f'SELECT content_id FROM posted_content WHERE content_id IN ({placeholders})', chunk
+                )
+                found = {row[0] for row in c}
+                for content_id in chunk:
+                    self.posted_index.record_fallback(content_id in found)
+                    if content_id not in found:
+                        unposted.add(content_id)
+        return unposted
+
+    @metrics.timed_method('db_operation')
     def add_posted(self, content_id, source, content):
-        with sqlite3.connect(self.db_file) as conn:
-            c = conn.cursor()
-            c.execute('''INSERT INTO posted_content (content_id, source, content, posted_date)
-                        VALUES (?, ?, ?, ?)''', 
+        with self._lock, self.conn:
+            self.conn.execute('''INSERT INTO posted_content (content_id, source, content, posted_date)
+                        VALUES (?, ?, ?, ?)''',
                         (content_id, source, content, datetime.now()))
-            conn.commit() 
\ No newline at end of file
+            self._index_posted([content_id])
+
+    @metrics.timed_method('db_operation')
+    def add_posted_many(self, items):
+        """Record many (content_id, source, content) tuples in one transaction.
+
+        Ids another job recorded first are left as they are.
+        """
+        items = list(items)
+        now = datetime.now()
+        with self._lock, self.conn:
+            self.conn.executemany('''INSERT OR IGNORE INTO posted_content (content_id, source, content, posted_date)
+                        VALUES (?, ?, ?, ?)''',
+                        [(content_id, source, content, now) for content_id, source, content in items])
+            self._index_posted([content_id for content_id, _, _ in items])
+
+    @metrics.timed_method('db_operation')
+    def expired_posted(self, before, source=None, exclude_sources=(), limit=1000):
+        """Posts from before that still carry their content, oldest first.
+
+        source limits the rows to one source; exclude_sources skips sources
+        that have their own retention.
+        """
+        query = 'SELECT content_id, source, content, posted_date FROM posted_content WHERE posted_date < ? AND content IS NOT NULL'
+        params = [before]
+        if source is not None:
+            query += ' AND source = ?'
+            params.append(source)
+        if exclude_sources:
+            query += f" AND source NOT IN ({','.join('?' * len(exclude_sources))})"
+            params.extend(exclude_sources)
+        query += ' ORDER BY posted_date LIMIT ?'
+        params.append(limit)
+        with self._lock:
+            return self.conn.execute(query, params).fetchall()
+
+    def strip_posted_content(self, content_ids):
+        """Keep only the ids of these posts, for dedup."""
+        with self._lock, self.conn:
+            self.conn.executemany('UPDATE posted_content SET content = NULL WHERE content_id = ?',
+                                  [(content_id,) for content_id in content_ids])
+
+    def delete_posted(self, content_ids):
+        with self._lock, self.conn:
+            self.conn.executemany('DELETE FROM posted_content WHERE content_id = ?',
+                                  [(content_id,) for content_id in content_ids])
+
+    def delete_posted_outbox(self, before_ts):
+        with self._lock, self.conn:
+            return self.conn.execute("DELETE FROM outbox WHERE status = 'posted' AND created_at < ?",
+                                     (before_ts,)).rowcount
+
+    def enable_incremental_vacuum(self):
+        """Switch an existing database to incremental auto-vacuum; needs one full VACUUM."""
+        with self._lock:
+            if self.conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+                return
+            logging.info("Converting the database to incremental vacuum, this runs a full VACUUM once")
+            self.conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            self.conn.execute('VACUUM')
+
+    def incremental_vacuum(self, pages=None):
+        """Return up to pages free pages to the file system; None frees them all."""
+        with self._lock:
+            # execute() steps the pragma once, freeing a single page; executescript runs it to completion
+            self.conn.executescript('PRAGMA incremental_vacuum;' if pages is None else f'PRAGMA incremental_vacuum({int(pages)});')
+            self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+
+    def storage_stats(self):
+        with self._lock:
+            page_size = self.conn.execute('PRAGMA page_size').fetchone()[0]
+            page_count = self.conn.execute('PRAGMA page_count').fetchone()[0]
+            free_pages = self.conn.execute('PRAGMA freelist_count').fetchone()[0]
+            posted = self.conn.execute('SELECT COUNT(*), COUNT(content) FROM posted_content').fetchone()
+        wal_file = f"{self.db_file}-wal"
+        return {
+            'file_bytes': os.path.getsize(self.db_file) if os.path.exists(self.db_file) else 0,
+            'wal_bytes': os.path.getsize(wal_file) if os.path.exists(wal_file) else 0,
+            'page_size': page_size,
+            'pages': page_count,
+            'free_pages': free_pages,
+            'posted_rows': posted[0],
+            'posted_with_content': posted[1],
+        }
+
+    @metrics.timed_method('db_operation')
+    def enqueue_posts(self, items, account=''):
+        """Add (content_id, content, source) items to an account's outbox; returns how many were new."""
+        now = time.time()
+        with self._lock, self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany('''INSERT OR IGNORE INTO outbox (content_id, source, content, status, attempts, next_attempt_at, created_at, account)
+                        VALUES (?, ?, ?, 'pending', 0, ?, ?, ?)''',
+                        [(content_id, source, content, now, now, account) for content_id, content, source in items])
+            return self.conn.total_changes - before
+
+    @metrics.timed_method('db_operation')
+    def next_outbox_item(self, now, account=''):
+        with self._lock:
+            c = self.conn.execute('''SELECT content_id, content, source, attempts FROM outbox
+                        WHERE account = ? AND status = 'pending' AND next_attempt_at <= ?
+                        ORDER BY rowid LIMIT 1''', (account, now))
+            return c.fetchone()
+
+    def next_outbox_due(self, account=''):
+        with self._lock:
+            c = self.conn.execute("SELECT MIN(next_attempt_at) FROM outbox WHERE account = ? AND status = 'pending'",
+                                  (account,))
+            return c.fetchone()[0]
+
+    def pending_outbox_count(self, account=None):
+        with self._lock:
+            if account is None:
+                c = self.conn.execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'")
+            else:
+                c = self.conn.execute("SELECT COUNT(*) FROM outbox WHERE account = ? AND status = 'pending'", (account,))
+            return c.fetchone()[0]
+
+    @metrics.timed_method('db_operation')
+    def mark_outbox_posted(self, content_id, source, content, status_id):
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE outbox SET status = 'posted', status_id = ?, last_error = NULL WHERE content_id = ?",
+                              (status_id, content_id))
+            self.conn.execute('''INSERT OR IGNORE INTO posted_content (content_id, source, content, posted_date)
+                        VALUES (?, ?, ?, ?)''',
+                        (content_id, source, content, datetime.now()))
+            self._index_posted([content_id])
+
+    def outbox_status(self, content_id):
+        """(status, status_id, next_attempt_at) of an outbox item, or None."""
+        with self._lock:
+            c = self.conn.execute('SELECT status, status_id, next_attempt_at FROM outbox WHERE content_id = ?',
+                                  (content_id,))
+            return c.fetchone()
+
+    def reschedule_outbox(self, content_id, attempts, next_attempt_at, error):
+        with self._lock, self.conn:
+            self.conn.execute('UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE content_id = ?',
+                              (attempts, next_attempt_at, error, content_id))
+
+    def mark_outbox_failed(self, content_id, attempts, error):
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE outbox SET status = 'failed', attempts = ?, last_error = ? WHERE content_id = ?",
+                              (attempts, error, content_id))
+
+    @metrics.timed_method('db_operation')
+    def upsert_events(self, rows):
+        """Store (event_id, start_ts, data, content_hash) rows; returns how many were new or changed."""
+        now = time.time()
+        changed = 0
+        with self._lock, self.conn:
+            for event_id, start_ts, data, content_hash in rows:
+                c = self.conn.execute('SELECT content_hash FROM events WHERE event_id = ?', (event_id,))
+                row = c.fetchone()
+                if row is not None and row[0] == content_hash:
+                    continue
+                self.conn.execute('''INSERT OR REPLACE INTO events (event_id, start_ts, data, content_hash, synced_at)
+                            VALUES (?, ?, ?, ?, ?)''',
+                            (event_id, start_ts, data, content_hash, now))
+                changed += 1
+        return changed
+
+    @metrics.timed_method('db_operation')
+    def events_between(self, start_ts, end_ts):
+        with self._lock:
+            c = self.conn.execute('SELECT data FROM events WHERE start_ts >= ? AND start_ts < ? ORDER BY start_ts',
+                                  (start_ts, end_ts))
+            return [json.loads(row[0]) for row in c]
+
+    def delete_events_missing(self, start_ts, end_ts, event_ids):
+        """Delete events starting in [start_ts, end_ts) that are not in event_ids."""
+        keep = set(event_ids)
+        with self._lock, self.conn:
+            c = self.conn.execute('SELECT event_id FROM events WHERE start_ts >= ? AND start_ts < ?', (start_ts, end_ts))
+            missing = [(row[0],) for row in c if row[0] not in keep]
+            self.conn.executemany('DELETE FROM events WHERE event_id = ?', missing)
+        return len(missing)
+
+    def delete_events_before(self, start_ts):
+        with self._lock, self.conn:
+            return self.conn.execute('DELETE FROM events WHERE start_ts < ?', (start_ts,)).rowcount
+
+    @metrics.timed_method('db_operation')
+    def schedule_reminders(self, rows):
+        """Upsert (reminder_id, event_id, reminder_type, due_ts, expire_ts, start_ts) rows.
+
+        A reminder whose due time moved is pending again, with its failed
+        attempts forgotten; otherwise its status is kept.
+        """
+        with self._lock, self.conn:
+            self.conn.executemany('''INSERT INTO reminders (reminder_id, event_id, reminder_type, due_ts, expire_ts, start_ts, status)
+                        VALUES (?, ?, ?, ?, ?, ?, 'pending')
+                        ON CONFLICT(reminder_id) DO UPDATE SET
+                            status = CASE WHEN reminders.due_ts != excluded.due_ts THEN 'pending' ELSE reminders.status END,
+                            attempts = CASE WHEN reminders.due_ts != excluded.due_ts THEN 0 ELSE reminders.attempts END,
+                            retry_at = CASE WHEN reminders.due_ts != excluded.due_ts THEN NULL ELSE reminders.retry_at END,
+                            due_ts = excluded.due_ts,
+                            expire_ts = excluded.expire_ts,
+                            start_ts = excluded.start_ts''', rows)
+
+    @metrics.timed_method('db_operation')
+    def due_reminders(self, now):
+        with self._lock:
+            c = self.conn.execute('''SELECT reminder_id, event_id, reminder_type, start_ts FROM reminders
+                        WHERE status = 'pending' AND due_ts <= ? AND (retry_at IS NULL OR retry_at <= ?)
+                        ORDER BY due_ts''', (now, now))
+            return c.fetchall()
+
+    @metrics.timed_method('db_operation')
+    def reminders_due_between(self, start_ts, end_ts):
+        with self._lock:
+            c = self.conn.execute('''SELECT reminder_id, event_id, reminder_type, start_ts FROM reminders
+                        WHERE due_ts >= ? AND due_ts < ? ORDER BY due_ts''', (start_ts, end_ts))
+            return c.fetchall()
+
+    def expire_reminders(self, now):
+        with self._lock, self.conn:
+            return self.conn.execute('''UPDATE reminders SET status = 'missed'
+                        WHERE status = 'pending' AND due_ts <= ? AND expire_ts <= ?''', (now, now)).rowcount
+
+    def mark_reminders(self, reminder_ids, status):
+        with self._lock, self.conn:
+            self.conn.executemany('UPDATE reminders SET status = ? WHERE reminder_id = ?',
+                                  [(status, reminder_id) for reminder_id in reminder_ids])
+
+    def retry_reminders_later(self, reminder_ids, now, backoff):
+        """Hold failed reminders back for backoff seconds, doubling with each attempt."""
+        with self._lock, self.conn:
+            self.conn.executemany('''UPDATE reminders SET attempts = attempts + 1,
+                            retry_at = ? + ? * (1 << MIN(attempts, 6))
+                        WHERE reminder_id = ?''', [(now, backoff, reminder_id) for reminder_id in reminder_ids])
+
+    def next_reminder_due(self):
+        with self._lock:
+            c = self.conn.execute("""SELECT MIN(MAX(due_ts, COALESCE(retry_at, 0))) FROM reminders
+                        WHERE status = 'pending'""")
+            return c.fetchone()[0]
+
+    def delete_orphan_reminders(self):
+        """Drop reminders for events that are no longer in the events table."""
+        with self._lock, self.conn:
+            return self.conn.execute('''DELETE FROM reminders
+                        WHERE event_id NOT IN (SELECT event_id FROM events)''').rowcount
+
+    @metrics.timed_method('db_operation')
+    def add_fingerprints(self, rows, since):
+        """Store (content_id, account, kind, simhash, source, created_at, buckets) rows.
+
+        Fingerprints created before since are pruned in the same transaction.
+        """
+        with self._lock, self.conn:
+            self.conn.execute('''DELETE FROM fingerprint_buckets WHERE content_id IN
+                        (SELECT content_id FROM fingerprints WHERE created_at < ?)''', (since,))
+            self.conn.execute('DELETE FROM fingerprints WHERE created_at < ?', (since,))
+            for content_id, account, kind, simhash, source, created_at, buckets in rows:
+                self.conn.execute('''INSERT OR REPLACE INTO fingerprints (content_id, kind, account, simhash, source, created_at)
+                            VALUES (?, ?, ?, ?, ?, ?)''',
+                            (content_id, kind, account, simhash, source, created_at))
+                self.conn.execute('DELETE FROM fingerprint_buckets WHERE content_id = ? AND kind = ?', (content_id, kind))
+                self.conn.executemany('INSERT INTO fingerprint_buckets (account, kind, bucket, content_id) VALUES (?, ?, ?, ?)',
+                                      [(account, kind, bucket, content_id) for bucket in buckets])
+
+    @metrics.timed_method('db_operation')
+    def fingerprint_candidates(self, account, kind, buckets, since):
+        """(content_id, source, simhash) of fingerprints sharing any of buckets."""
+        placeholders = ','.join('?' * len(buckets))
+        with self._lock:
+            c = self.conn.execute(f'''SELECT DISTINCT f.content_id, f.source, f.simhash
+                        FROM fingerprint_buckets b JOIN fingerprints f ON f.content_id = b.content_id AND f.kind = b.kind
+                        WHERE b.account = ? AND b.kind = ? AND b.bucket IN ({placeholders}) AND f.created_at >= ?''',
+                        [account, kind, *buckets, since])
+            return c.fetchall()
+
+    def get_circuit(self, name):
+        with self._lock:
+            c = self.conn.execute('SELECT failures, opened_at FROM circuit_breakers WHERE name = ?', (name,))
+            return c.fetchone()
+
+    def save_circuit(self, name, failures, opened_at):
+        with self._lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO circuit_breakers (name, failures, opened_at) VALUES (?, ?, ?)',
+                              (name, failures, opened_at))
+
+    def get_sync_state(self, key):
+        with self._lock:
+            c = self.conn.execute('SELECT value FROM sync_state WHERE key = ?', (key,))
+            row = c.fetchone()
+            return row[0] if row else None
+
+    def set_sync_state(self, key, value):
+        with self._lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)', (key, str(value)))
+
+    def _index_posted(self, content_ids):
+        for content_id in content_ids:
+            self.posted_index.add(content_id)
+        if self.posted_index.needs_rebuild:
+            self.load_posted_index()
+
+    @metrics.timed_method('db_operation')
+    def get_http_validators(self, url):
+        with self._lock:
+            c = self.conn.execute('SELECT etag, last_modified, body FROM http_validators WHERE url = ?', (url,))
+            return c.fetchone()
+
+    @metrics.timed_method('db_operation')
+    def save_http_validators(self, url, etag, last_modified, body):
+        with self._lock, self.conn:
+            self.conn.execute('''INSERT OR REPLACE INTO http_validators (url, etag, last_modified, body, updated_date)
+                        VALUES (?, ?, ?, ?, ?)''',
+                        (url, etag, last_modified, body, datetime.now()))
+
+    @metrics.timed_method('db_operation')
+    def delete_http_validators(self, url):
+        with self._lock, self.conn:
+            self.conn.execute('DELETE FROM http_validators WHERE url = ?', (url,))
+
+    @metrics.timed_method('db_operation')
+    def get_event_detail(self, event_id):
+        with self._lock:
+            c = self.conn.execute('SELECT details, content_hash, fetched_at FROM event_details WHERE event_id = ?', (event_id,))
+            return c.fetchone()
+
+    @metrics.timed_method('db_operation')
+    def save_event_detail(self, event_id, details, content_hash, fetched_at, max_entries):
+        with self._lock, self.conn:
+            self.conn.execute('''INSERT OR REPLACE INTO event_details (event_id, details, content_hash, fetched_at)
+                        VALUES (?, ?, ?, ?)''',
+                        (event_id, details, content_hash, fetched_at))
+            # Evict the least recently refreshed entries beyond the cap
+            self.conn.execute('''DELETE FROM event_details WHERE event_id IN
+                        (SELECT event_id FROM event_details ORDER BY fetched_at DESC LIMIT -1 OFFSET ?)''',
+                        (max_entries,))
+
+    def touch_event_detail(self, event_id, fetched_at):
+        with self._lock, self.conn:
+            self.conn.execute('UPDATE event_details SET fetched_at = ? WHERE event_id = ?', (fetched_at, event_id))
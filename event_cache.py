@@ -0,0 +1,77 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+from config import Config
+
+
+class EventDetailCache:
+    """Cache for parsed event details, keyed by event id.
+
+    Entries live in an in-memory LRU backed by the event_details table, so
+    they survive restarts. An entry younger than ttl is served without any
+    request; an older one is revalidated by the caller (ETag or content hash)
+    and refreshed with touch() when the page has not changed.
+    """
+
+    def __init__(self, database, ttl=None, memory_size=None, max_entries=None):
+        self.database = database
+        self.ttl = ttl if ttl is not None else Config.EVENT_CACHE_TTL_HOURS * 3600
+        self.memory_size = memory_size if memory_size is not None else Config.EVENT_CACHE_MEMORY_SIZE
+        self.max_entries = max_entries if max_entries is not None else Config.EVENT_CACHE_MAX_ENTRIES
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, event_id):
+        """Return (details, content_hash, fresh) or None if the event is unknown."""
+        event_id = str(event_id)
+        with self._lock:
+            entry = self._entries.get(event_id)
+            if entry is not None:
+                self._entries.move_to_end(event_id)
+
+        if entry is None:
+            row = self.database.get_event_detail(event_id)
+            if row is None:
+                self.misses += 1
+                metrics.inc('cache_requests_total', cache='event_details', result='miss')
+                return None
+            details_json, content_hash, fetched_at = row
+            entry = (json.loads(details_json), content_hash, fetched_at)
+            self._remember(event_id, entry)
+
+        details, content_hash, fetched_at = entry
+        fresh = time.time() - fetched_at < self.ttl
+        if fresh:
+            self.hits += 1
+        else:
+            self.misses += 1
+        metrics.inc('cache_requests_total', cache='event_details', result='hit' if fresh else 'miss')
+        return details, content_hash, fresh
+
+    def put(self, event_id, details, content_hash):
+        event_id = str(event_id)
+        fetched_at = time.time()
+        self._remember(event_id, (details, content_hash, fetched_at))
+        self.database.save_event_detail(event_id, json.dumps(details), content_hash, fetched_at, self.max_entries)
+
+    def touch(self, event_id):
+        """Mark a cached entry as revalidated, restarting its TTL."""
+        event_id = str(event_id)
+        fetched_at = time.time()
+        with self._lock:
+            entry = self._entries.get(event_id)
+            if entry is not None:
+                self._entries[event_id] = (entry[0], entry[1], fetched_at)
+        self.database.touch_event_detail(event_id, fetched_at)
+
+    def _remember(self, event_id, entry):
+        with self._lock:
+            self._entries[event_id] = entry
+            self._entries.move_to_end(event_id)
+            while len(self._entries) > self.memory_size:
+                self._entries.popitem(last=False)
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+from config import Config
+from events_api import parse_start_time
+
+DELTA_FIELDS = ('date_updated', 'date_created')
+
+
+def event_hash(event):
+    return hashlib.md5(json.dumps(event, sort_keys=True).encode()).hexdigest()
+
+
+class EventSync:
+    """Mirror of the keskisuomievents.fi events in the local events table.
+
+    A full sync reads the whole upcoming window and drops local events that
+    disappeared from it. In between, delta syncs ask the API only for events
+    created or updated since the previous sync (Directus date_created /
+    date_updated filters), so remote traffic follows the rate of change
+    rather than the size of the calendar. If the API does not expose those
+    fields, or a delta request fails, the sync falls back to a full read.
+    """
+
+    def __init__(self, database, events_api, timezone, reminders=None, window_days=None, full_sync_hours=None, min_interval=None):
+        self.database = database
+        self.events_api = events_api
+        self.reminders = reminders
+        self.timezone = timezone
+        self.window_days = window_days if window_days is not None else Config.EVENT_SYNC_DAYS
+        self.full_sync_interval = (full_sync_hours if full_sync_hours is not None else Config.EVENT_FULL_SYNC_HOURS) * 3600
+        self.min_interval = min_interval if min_interval is not None else Config.EVENT_SYNC_MIN_INTERVAL
+        self._lock = threading.Lock()
+
+    def sync(self):
+        """Bring the local store up to date, at most once per min_interval."""
+        with self._lock:
+            now = time.time()
+            last_sync = float(self.database.get_sync_state('events_last_sync') or 0)
+            if now - last_sync < self.min_interval:
+                return
+
+            last_full_sync = float(self.database.get_sync_state('events_last_full_sync') or 0)
+            delta_supported = self.database.get_sync_state('events_delta_supported') == '1'
+
+            if delta_supported and now - last_full_sync < self.full_sync_interval:
+                try:
+                    self._delta_sync(last_sync)
+                    self.database.set_sync_state('events_last_sync', now)
+                    return
+                except Exception as e:
+                    logging.error(f"Delta event sync failed, falling back to full sync: {e}")
+
+            self._full_sync()
+            self.database.set_sync_state('events_last_sync', now)
+            self.database.set_sync_state('events_last_full_sync', now)
+
+    def sync_range(self, start_date, end_date):
+        """Read an explicit date range from the API into the store."""
+        with self._lock:
+            start = start_date.strftime('%Y-%m-%d')
+            end = end_date.strftime('%Y-%m-%d')
+            # Events come sorted by start time, so reading stops at the first one past the range
+            if not isinstance(end_date, datetime):
+                window_end = self.timezone.localize(datetime(end_date.year, end_date.month, end_date.day))
+            elif end_date.tzinfo is None:
+                window_end = self.timezone.localize(end_date)
+            else:
+                window_end = end_date
+            events = self.events_api.iter_events(start, end, self.timezone, window_end=window_end)
+            seen, changed = self._store(events)
+            logging.info(f"Synced {seen} events for {start}..{end}, {changed} new or changed")
+
+    def events_between(self, start, end):
+        """Return stored events with start <= start_time < end, sorted by start_time."""
+        return self.database.events_between(start.timestamp(), end.timestamp())
+
+    def _full_sync(self):
+        now = datetime.now(self.timezone)
+        end = now + timedelta(days=self.window_days)
+        events = list(self.events_api.iter_events('now', end.strftime('%Y-%m-%d'), self.timezone,
+                                                  window_end=end, strict=True))
+        seen, changed = self._store(events)
+
+        removed = self.database.delete_events_missing(
+            now.timestamp(), end.timestamp(), [str(event['id']) for event in events]
+        )
+        # Past events are no longer needed for reminders or digests
+        self.database.delete_events_before((now - timedelta(days=1)).timestamp())
+        if self.reminders is not None:
+            self.reminders.prune()
+
+        delta_supported = any(field in event for event in events for field in DELTA_FIELDS)
+        self.database.set_sync_state('events_delta_supported', '1' if delta_supported else '0')
+        logging.info(f"Full event sync: {seen} events, {changed} new or changed, {removed} removed")
+
+    def _delta_sync(self, since):
+        # Small overlap so changes made during the previous request are not missed
+        since_iso = datetime.fromtimestamp(since - 300, pytz.utc).strftime('%Y-%m-%dT%H:%M:%S')
+        end = datetime.now(self.timezone) + timedelta(days=self.window_days)
+        filters = {
+            'filter[_or][0][date_updated][_gte]': since_iso,
+            'filter[_or][1][date_created][_gte]': since_iso,
+        }
+        events = self.events_api.iter_events('now', end.strftime('%Y-%m-%d'), self.timezone,
+                                             window_end=end, filters=filters, strict=True)
+        seen, changed = self._store(events)
+        logging.info(f"Delta event sync: {seen} events returned, {changed} new or changed")
+
+    def _store(self, events):
+        rows = []
+        for event in events:
+            try:
+                start_time = parse_start_time(event, self.timezone)
+                rows.append((str(event['id']), start_time.timestamp(), json.dumps(event), event_hash(event)))
+            except Exception as e:
+                logging.error(f"Error processing event {event.get('id', 'unknown')}: {e}")
+        changed = self.database.upsert_events(rows)
+        if self.reminders is not None:
+            self.reminders.schedule_events((event_id, start_ts) for event_id, start_ts, _, _ in rows)
+        return len(rows), changed
@@ -0,0 +1,78 @@
+import logging
+from datetime import datetime
+
+from config import Config
+
+EVENTS_API_URL = "https://keskisuomievents.fi/api/items/event"
+
+
+def parse_start_time(event, timezone):
+    return datetime.fromisoformat(event['start_time'].replace('Z', '+00:00')).astimezone(timezone)
+
+
+class EventsApiClient:
+    """Lazy, paginated reader for the keskisuomievents.fi event API.
+
+    Pages are requested one at a time with limit/offset and their events are
+    yielded as soon as each page arrives. Results are sorted by start_time,
+    so iteration stops at the first event starting after window_end without
+    requesting the remaining pages.
+    """
+
+    def __init__(self, http_client, page_size=None, max_pages=None, url=EVENTS_API_URL):
+        self.http = http_client
+        self.page_size = page_size or Config.EVENTS_API_PAGE_SIZE
+        self.max_pages = max_pages or Config.EVENTS_API_MAX_PAGES
+        self.url = url
+
+    def iter_events(self, start, end, timezone, window_end=None, filters=None, strict=False):
+        """Yield event dicts starting from start (an API date string or 'now').
+
+        Raises on a failed request for the first page; a failure on a later
+        page is logged and ends the iteration with what was already yielded.
+        With strict=True any failed page, or hitting max_pages, raises so the
+        caller knows the listing is incomplete.
+        """
+        params = {
+            'start': start,
+            'end': end,
+            'limit': self.page_size,
+            'sort': 'start_time',
+            'filter[start_time][_gte]': start,
+            'filter[end_time][_gte]': start
+        }
+        if filters:
+            params.update(filters)
+
+        for page in range(self.max_pages):
+            params['offset'] = page * self.page_size
+            try:
+                # Not conditional: sync URLs carry a fresh since/start every time, so a
+                # stored validator and body would never be reused
+                response = self.http.get(self.url, params=params)
+                response.raise_for_status()
+                events = response.json().get('data', [])
+            except Exception as e:
+                if page == 0 or strict:
+                    raise
+                logging.error(f"Error fetching events page {page + 1}, stopping: {e}")
+                return
+
+            logging.info(f"Fetched events page {page + 1} with {len(events)} events")
+
+            for event in events:
+                if window_end is not None:
+                    try:
+                        if parse_start_time(event, timezone) > window_end:
+                            return
+                    except Exception:
+                        # Let the caller log and skip malformed events
+                        pass
+                yield event
+
+            if len(events) < self.page_size:
+                return
+
+        if strict:
+            raise RuntimeError(f"Events listing exceeds {self.max_pages} pages")
+        logging.warning(f"Stopped reading events after {self.max_pages} pages")
@@ -0,0 +1,192 @@
+import logging
+
+from config import Config
+
+try:
+    from lxml import etree, html as lxml_html
+except ImportError:  # pragma: no cover - lxml is in requirements.txt
+    etree = None
+    lxml_html = None
+
+
+def _details(title, description):
+    return {
+        'title': title,
+        'description': description or '',
+        'short_description': description or '',
+        'location': '',
+        'start_time': ''
+    }
+
+
+def _has_class(element, class_name):
+    return class_name in (element.get('class') or '').split()
+
+
+class BeautifulSoupExtractor:
+    """The original extractor: parse the whole page with html.parser."""
+
+    name = 'bs4'
+    streaming = False
+
+    def extract(self, chunks, event_url):
+        # Only the fallback path needs bs4, so it is not imported at startup
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(b''.join(chunks), 'html.parser')
+
+        # Find the event title (try multiple approaches)
+        title = None
+        title_elem = soup.find('h1', class_='event-title')
+        if title_elem:
+            title = title_elem.text.strip()
+        else:
+            meta_title = soup.find('meta', property='og:title')
+            if meta_title:
+                title = meta_title.get('content', '').strip()
+
+        if not title:
+            logging.warning(f"Could not find title for event at {event_url}")
+            return None
+
+        # Find the event description (try multiple approaches)
+        description = None
+        desc_elem = soup.find('div', class_='event-description')
+        if desc_elem:
+            description = desc_elem.text.strip()
+        else:
+            meta_desc = soup.find('meta', property='og:description')
+            if meta_desc:
+                description = meta_desc.get('content', '').strip()
+            else:
+                short_desc = soup.find('div', class_='event-short-description')
+                if short_desc:
+                    description = short_desc.text.strip()
+
+        return _details(title, description)
+
+
+if etree is not None:
+    def _class_xpath(tag, class_name):
+        return etree.XPath(f"//{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')]")
+
+    TITLE_XPATH = _class_xpath('h1', 'event-title')
+    DESCRIPTION_XPATH = _class_xpath('div', 'event-description')
+    SHORT_DESCRIPTION_XPATH = _class_xpath('div', 'event-short-description')
+    OG_TITLE_XPATH = etree.XPath("//meta[@property='og:title']/@content")
+    OG_DESCRIPTION_XPATH = etree.XPath("//meta[@property='og:description']/@content")
+
+
+class LxmlExtractor:
+    """Parse the whole page with lxml and read it with compiled XPath selectors."""
+
+    name = 'lxml'
+    streaming = False
+
+    def extract(self, chunks, event_url):
+        tree = lxml_html.document_fromstring(b''.join(chunks))
+
+        title = None
+        title_elems = TITLE_XPATH(tree)
+        if title_elems:
+            title = title_elems[0].text_content().strip()
+        else:
+            meta_titles = OG_TITLE_XPATH(tree)
+            if meta_titles:
+                title = meta_titles[0].strip()
+
+        if not title:
+            logging.warning(f"Could not find title for event at {event_url}")
+            return None
+
+        description = None
+        desc_elems = DESCRIPTION_XPATH(tree)
+        if desc_elems:
+            description = desc_elems[0].text_content().strip()
+        else:
+            meta_descs = OG_DESCRIPTION_XPATH(tree)
+            if meta_descs:
+                description = meta_descs[0].strip()
+            else:
+                short_descs = SHORT_DESCRIPTION_XPATH(tree)
+                if short_descs:
+                    description = short_descs[0].text_content().strip()
+
+        return _details(title, description)
+
+
+class StreamingLxmlExtractor:
+    """Feed the page to lxml's pull parser chunk by chunk.
+
+    Reading stops as soon as both h1.event-title and div.event-description
+    have been parsed, so the rest of the page is never downloaded or parsed.
+    If the page lacks either element, the og: meta tags and the short
+    description seen on the way are used, with the same precedence as the
+    other extractors.
+    """
+
+    name = 'lxml-stream'
+    streaming = True
+
+    def extract(self, chunks, event_url):
+        parser = etree.HTMLPullParser(events=('end',))
+        found = {}
+
+        for chunk in chunks:
+            parser.feed(chunk)
+            for _, element in parser.read_events():
+                self._collect(element, found)
+            if 'title' in found and 'description' in found:
+                break
+        else:
+            parser.close()
+            for _, element in parser.read_events():
+                self._collect(element, found)
+
+        # An empty h1.event-title wins over og:title, as in the other extractors
+        title = found['title'] if 'title' in found else found.get('og:title')
+        if not title:
+            logging.warning(f"Could not find title for event at {event_url}")
+            return None
+
+        if 'description' in found:
+            description = found['description']
+        elif 'og:description' in found:
+            description = found['og:description']
+        else:
+            description = found.get('short_description')
+
+        return _details(title, description)
+
+    def _collect(self, element, found):
+        tag = element.tag
+        if tag == 'meta':
+            prop = element.get('property')
+            if prop in ('og:title', 'og:description') and prop not in found:
+                found[prop] = (element.get('content') or '').strip()
+        elif tag == 'h1' and 'title' not in found and _has_class(element, 'event-title'):
+            found['title'] = element.xpath('string()').strip()
+        elif tag == 'div':
+            if 'description' not in found and _has_class(element, 'event-description'):
+                found['description'] = element.xpath('string()').strip()
+            elif 'short_description' not in found and _has_class(element, 'event-short-description'):
+                found['short_description'] = element.xpath('string()').strip()
+
+
+EXTRACTORS = {
+    BeautifulSoupExtractor.name: BeautifulSoupExtractor,
+    LxmlExtractor.name: LxmlExtractor,
+    StreamingLxmlExtractor.name: StreamingLxmlExtractor,
+}
+
+
+def get_extractor(name=None):
+    """Return the configured extractor, falling back to BeautifulSoup."""
+    name = name or Config.EVENT_EXTRACTOR
+    if name != BeautifulSoupExtractor.name and etree is None:
+        logging.warning(f"lxml is not available, using the {BeautifulSoupExtractor.name} extractor")
+        name = BeautifulSoupExtractor.name
+    if name not in EXTRACTORS:
+        logging.warning(f"Unknown event extractor {name}, using {BeautifulSoupExtractor.name}")
+        name = BeautifulSoupExtractor.name
+    return EXTRACTORS[name]()
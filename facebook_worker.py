@@ -0,0 +1,139 @@
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+
+import metrics
+from circuit import CircuitBreaker, CircuitOpenError
+from config import Config
+
+
+def _worker_main(requests, results, memory_mb):
+    """Child process: scrape pages on request until told to stop with None."""
+    if memory_mb:
+        try:
+            import resource
+
+            limit = memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError) as e:
+            logging.warning(f"Could not cap Facebook worker memory: {e}")
+
+    while True:
+        job = requests.get()
+        if job is None:
+            return
+        page, pages = job
+        try:
+            # Imported here so facebook_scraper, requests-html and pyppeteer
+            # are only ever loaded in this process
+            from facebook_scraper import get_posts
+
+            posts = [
+                {'post_id': post['post_id'], 'text': post.get('text') or '', 'time': post['time']}
+                for post in get_posts(page, pages=pages)
+            ]
+            results.put(('ok', posts))
+        except BaseException as e:
+            # MemoryError from the rlimit lands here too
+            results.put(('error', f"{type(e).__name__}: {e}"))
+
+
+class FacebookWorker:
+    """Run facebook_scraper in a separate process with a hard timeout.
+
+    The process is started on first use and serves one page at a time over
+    a pair of queues. It is killed if it does not answer within timeout or
+    dies, and replaced after max_runs requests to give its memory back.
+    Repeated failures open a circuit, and Facebook is then skipped for a
+    cooldown instead of hanging every run.
+    """
+
+    def __init__(self, timeout=None, memory_mb=None, max_runs=None, breaker=None):
+        self.timeout = timeout if timeout is not None else Config.FACEBOOK_WORKER_TIMEOUT
+        self.memory_mb = memory_mb if memory_mb is not None else Config.FACEBOOK_WORKER_MEMORY_MB
+        self.max_runs = max_runs if max_runs is not None else Config.FACEBOOK_WORKER_MAX_RUNS
+        self.breaker = breaker or CircuitBreaker(
+            'facebook', Config.FACEBOOK_FAILURE_THRESHOLD, Config.FACEBOOK_COOLDOWN_MINUTES * 60
+        )
+        # spawn, not fork: the parent holds a SQLite connection and worker threads
+        self._context = multiprocessing.get_context('spawn')
+        self._process = None
+        self._requests = None
+        self._results = None
+        self._runs = 0
+        self._lock = threading.Lock()
+
+    def get_posts(self, page, pages=1):
+        """Return dicts with post_id, text and time for the newest posts of page."""
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Facebook scraping is paused for another {self.breaker.retry_in():.0f}s")
+        with self._lock:
+            try:
+                posts = self._request(page, pages)
+            except Exception:
+                self.breaker.record_failure()
+                raise
+        self.breaker.record_success()
+        return posts
+
+    def _request(self, page, pages):
+        if self._process is None or not self._process.is_alive():
+            self._start()
+
+        self._requests.put((page, pages))
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                status, payload = self._results.get(timeout=min(1, max(0, deadline - time.monotonic())))
+                break
+            except queue.Empty:
+                if not self._process.is_alive():
+                    self._stop('crashed')
+                    raise RuntimeError(f"Facebook worker exited with code {self._process.exitcode}")
+                if time.monotonic() >= deadline:
+                    self._stop('timeout')
+                    raise TimeoutError(f"Facebook worker did not answer within {self.timeout}s")
+
+        self._runs += 1
+        if self._runs >= self.max_runs:
+            self._stop('max_runs')
+        if status != 'ok':
+            raise RuntimeError(payload)
+        return payload
+
+    def _start(self):
+        self._requests = self._context.Queue()
+        self._results = self._context.Queue()
+        self._process = self._context.Process(
+            target=_worker_main,
+            args=(self._requests, self._results, self.memory_mb),
+            name='facebook-worker',
+            daemon=True
+        )
+        self._process.start()
+        self._runs = 0
+        logging.info(f"Started Facebook worker process {self._process.pid}")
+
+    def _stop(self, reason):
+        process = self._process
+        if process is None:
+            return
+        if reason in ('max_runs', 'shutdown') and process.is_alive():
+            # Idle between requests, so it can exit on its own
+            self._requests.put(None)
+            process.join(5)
+        if process.is_alive():
+            process.kill()
+            process.join(5)
+        metrics.inc('facebook_worker_restarts_total', reason=reason)
+        logging.info(f"Stopped Facebook worker process {process.pid} ({reason})")
+        for q in (self._requests, self._results):
+            q.close()
+            q.cancel_join_thread()
+
+    def close(self):
+        with self._lock:
+            if self._process is not None and self._process.is_alive():
+                self._stop('shutdown')
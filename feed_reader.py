@@ -0,0 +1,123 @@
+import hashlib
+import logging
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+try:
+    from lxml import etree
+except ImportError:  # pragma: no cover - lxml is in requirements.txt
+    etree = None
+
+ITEM_TAGS = ('item', 'entry')
+DATE_TAGS = ('pubDate', 'published', 'updated', 'date')
+
+
+def _local_name(tag):
+    # '{http://www.w3.org/2005/Atom}entry' -> 'entry'
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
+
+
+def parse_date(value):
+    """RFC 822 (RSS) or ISO 8601 (Atom) date as naive UTC, like feedparser's *_parsed, or None."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class FeedEntry:
+    __slots__ = ('title', 'link', 'published')
+
+    def __init__(self, title, link, published):
+        self.title = title
+        self.link = link
+        self.published = published
+
+
+def _entry(element):
+    title = link = published = None
+    for child in element:
+        name = _local_name(child.tag)
+        if name == 'title':
+            title = (child.text or '').strip()
+        elif name == 'link' and link is None:
+            # RSS has the URL as text, Atom in href; prefer Atom's rel="alternate"
+            if child.get('rel') in (None, 'alternate'):
+                link = (child.get('href') or child.text or '').strip()
+        elif name in DATE_TAGS and published is None:
+            published = parse_date(child.text)
+    return FeedEntry(title or '', link, published)
+
+
+class StreamingFeedReader:
+    """Parse RSS 2.0 or Atom entries as the body streams in.
+
+    Each item is parsed and dropped as soon as its closing tag arrives, so
+    memory stays bounded by one entry and a chunk, not the whole feed.
+    The caller decides when to stop: leaving the loop stops the download.
+    After iterating, digest is the MD5 of the bytes read so far and
+    in_order tells whether the entries came newest first.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.in_order = True
+        self.entries_read = 0
+        self._hasher = hashlib.md5()
+
+    @property
+    def digest(self):
+        return self._hasher.hexdigest()
+
+    def __iter__(self):
+        if etree is not None:
+            parser = etree.XMLPullParser(events=('end',), recover=True, resolve_entities=False)
+        else:
+            from xml.etree.ElementTree import XMLPullParser
+
+            parser = XMLPullParser(events=('end',))
+
+        previous = None
+        for element in self._items(parser):
+            entry = _entry(element)
+            self._release(element)
+            if not entry.link:
+                continue
+            self.entries_read += 1
+            if previous and entry.published and entry.published > previous:
+                if self.in_order:
+                    logging.debug(f"Feed entry {entry.link} is newer than the one before it")
+                self.in_order = False
+            previous = entry.published or previous
+            yield entry
+
+    def _items(self, parser):
+        for chunk in self.chunks:
+            self._hasher.update(chunk)
+            parser.feed(chunk)
+            yield from self._ended_items(parser)
+        parser.close()
+        yield from self._ended_items(parser)
+
+    @staticmethod
+    def _ended_items(parser):
+        for _, element in parser.read_events():
+            if _local_name(element.tag) in ITEM_TAGS:
+                yield element
+
+    @staticmethod
+    def _release(element):
+        element.clear()
+        if etree is not None:
+            # Parsed siblings stay attached to the channel until they are deleted
+            while element.getprevious() is not None:
+                del element.getparent()[0]
@@ -0,0 +1,151 @@
+import os
+import logging
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    import tomli as tomllib
+
+from config import Config
+
+FEED_KINDS = ('rss', 'facebook', 'events', 'weekly_events')
+# Event reminders and the weekly digest share one regional event store,
+# so there is at most one feed of each
+EVENT_FEED_KINDS = ('events', 'weekly_events')
+
+
+class Feed:
+    """One upstream source, fetched once per run and shared by its subscribers.
+
+    interval is in minutes; 0 falls back to the per-kind interval from
+    Config. cron only applies to weekly_events.
+    """
+
+    def __init__(self, name, kind, url=None, page=None, interval=0, cron=None, timeout=None):
+        if kind not in FEED_KINDS:
+            raise ValueError(f"Feed {name!r} has unknown type {kind!r}")
+        if kind == 'rss' and not url:
+            raise ValueError(f"RSS feed {name!r} needs a url")
+        if kind == 'facebook' and not page:
+            raise ValueError(f"Facebook feed {name!r} needs a page")
+        self.name = name
+        self.kind = kind
+        self.url = url
+        self.page = page
+        self.interval = interval
+        self.cron = cron
+        self.timeout = timeout
+
+
+class Account:
+    """A Mastodon account and the feeds it posts.
+
+    key namespaces the account's content ids in the database, so each
+    account keeps its own dedup history. The empty key stores ids as they
+    are, which is how the single-account bot always stored them.
+    """
+
+    def __init__(self, name, instance, access_token, feeds, hashtags=None, event_hashtags=None, key=None):
+        if not instance or not access_token:
+            raise ValueError(f"Account {name!r} needs an instance and an access token")
+        self.name = name
+        self.instance = instance
+        self.access_token = access_token
+        self.feeds = list(feeds)
+        self.hashtags = Config.HASHTAGS if hashtags is None else hashtags
+        self.event_hashtags = Config.EVENT_HASHTAGS if event_hashtags is None else event_hashtags
+        self.key = name if key is None else key
+
+    def scoped_id(self, content_id):
+        return f"{self.key}:{content_id}" if self.key else content_id
+
+    def render(self, feed, content, reply=False):
+        # Replies in a thread go without hashtags; the first post has them
+        if reply:
+            return content
+        hashtags = self.event_hashtags if feed.kind in EVENT_FEED_KINDS else self.hashtags
+        return f"{content}\n\n{hashtags}" if hashtags else content
+
+
+class FeedConfig:
+    def __init__(self, feeds, accounts):
+        self.feeds = {}
+        for feed in feeds:
+            if feed.name in self.feeds:
+                raise ValueError(f"Feed {feed.name!r} is defined twice")
+            self.feeds[feed.name] = feed
+        for kind in EVENT_FEED_KINDS:
+            if sum(1 for feed in feeds if feed.kind == kind) > 1:
+                raise ValueError(f"Only one {kind} feed is supported")
+
+        if not accounts:
+            raise ValueError("At least one account is required")
+        keys = [account.key for account in accounts]
+        if len(set(keys)) != len(keys):
+            raise ValueError("Account keys must be unique")
+        for account in accounts:
+            for name in account.feeds:
+                if name not in self.feeds:
+                    raise ValueError(f"Account {account.name!r} subscribes to unknown feed {name!r}")
+        self.accounts = list(accounts)
+
+    def subscribers(self, feed_name):
+        return [account for account in self.accounts if feed_name in account.feeds]
+
+    def active_feeds(self):
+        """Feeds with at least one subscriber, in definition order."""
+        return [feed for feed in self.feeds.values() if self.subscribers(feed.name)]
+
+
+def default_feed_config(instance=None, access_token=None):
+    """The single Jyväskylä account configured through environment variables."""
+    feeds = [
+        Feed('weekly_events', 'weekly_events'),
+        Feed('events', 'events'),
+        Feed('jyvaskyla_website', 'rss', url=Config.RSS_URL),
+        Feed('facebook', 'facebook', page=Config.FACEBOOK_PAGE, timeout=Config.FACEBOOK_TIMEOUT),
+    ]
+    account = Account(
+        'default',
+        instance or Config.MASTODON_INSTANCE,
+        access_token or Config.MASTODON_ACCESS_TOKEN,
+        [feed.name for feed in feeds],
+        key=''
+    )
+    return FeedConfig(feeds, [account])
+
+
+def load_feed_config(path):
+    """Read feeds and accounts from a TOML file (see feeds.example.toml)."""
+    with open(path, 'rb') as f:
+        data = tomllib.load(f)
+
+    feeds = []
+    for entry in data.get('feeds', []):
+        feeds.append(Feed(
+            entry['name'],
+            entry['type'],
+            url=entry.get('url'),
+            page=entry.get('page'),
+            interval=entry.get('interval', 0),
+            cron=entry.get('cron'),
+            timeout=entry.get('timeout', Config.FACEBOOK_TIMEOUT if entry['type'] == 'facebook' else None)
+        ))
+
+    accounts = []
+    for entry in data.get('accounts', []):
+        # Keep tokens out of the file by naming the variable that holds them
+        token = entry.get('access_token') or os.getenv(entry.get('access_token_env', ''))
+        accounts.append(Account(
+            entry['name'],
+            entry.get('instance'),
+            token,
+            entry.get('feeds', []),
+            hashtags=entry.get('hashtags'),
+            event_hashtags=entry.get('event_hashtags'),
+            key=entry.get('key')
+        ))
+
+    config = FeedConfig(feeds, accounts)
+    logging.info(f"Loaded {len(config.feeds)} feeds and {len(config.accounts)} accounts from {path}")
+    return config
@@ -0,0 +1,148 @@
+import hashlib
+import logging
+import re
+import time
+
+import metrics
+from config import Config
+
+SIMHASH_BITS = 64
+# Headlines shorter than this are too generic ("Tiedote") to compare
+MIN_TOKENS = 4
+
+_URL_RE = re.compile(r'https?://\S+')
+_HASHTAG_RE = re.compile(r'#\w+')
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Lowercased words of text, without links, hashtags or punctuation.
+
+    Single letters are dropped, single digits are not: "tiedote 1" and
+    "tiedote 3" are different announcements.
+    """
+    text = _HASHTAG_RE.sub(' ', _URL_RE.sub(' ', text.lower()))
+    return [token for token in _TOKEN_RE.findall(text) if len(token) > 1 or token.isdigit()]
+
+
+def simhash(tokens):
+    """64-bit SimHash over the words and word pairs of tokens."""
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    weights = [0] * SIMHASH_BITS
+    for feature in features:
+        h = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'little')
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(SIMHASH_BITS) if weights[bit] > 0)
+
+
+def fingerprints(content):
+    """(kind, simhash) pairs for the headline and the whole text of a post.
+
+    An RSS item is only a title and a link, while a Facebook post about the
+    same announcement starts with that title and goes on, so the first line
+    is fingerprinted on its own as well.
+    """
+    prints = []
+    lines = [line for line in content.splitlines() if tokenize(line)]
+    if lines:
+        headline = tokenize(lines[0])
+        if len(headline) >= MIN_TOKENS:
+            prints.append(('headline', simhash(headline)))
+        body = tokenize(content)
+        if len(body) > len(headline):
+            prints.append(('body', simhash(body)))
+    return prints
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def to_signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << SIMHASH_BITS) if value >= 1 << (SIMHASH_BITS - 1) else value
+
+
+class NearDuplicateIndex:
+    """Suppress posts whose SimHash is within max_distance bits of a recent one.
+
+    The 64 bits are split into max_distance + 1 bands. Two hashes that differ
+    in at most max_distance bits agree on at least one whole band, so only
+    rows sharing a band value are fetched and compared, through an index.
+    """
+
+    def __init__(self, database, max_distance=None, window_hours=None):
+        self.database = database
+        self.max_distance = max_distance if max_distance is not None else Config.NEAR_DUPLICATE_DISTANCE
+        self.window = (window_hours if window_hours is not None else Config.NEAR_DUPLICATE_WINDOW_HOURS) * 3600
+        self.num_bands = self.max_distance + 1
+        self.band_bits = SIMHASH_BITS // self.num_bands
+
+    @property
+    def enabled(self):
+        return self.window > 0
+
+    def buckets(self, value):
+        mask = (1 << self.band_bits) - 1
+        # With a single band (max_distance 0) the bucket is the whole unsigned hash
+        return [to_signed(band << 32 | (value >> (band * self.band_bits)) & mask) for band in range(self.num_bands)]
+
+    def filter(self, account, items, record=True):
+        """Return the (content_id, content, source) items that are not near-duplicates.
+
+        Only an item from another source counts as a duplicate: the same
+        story reaching the account twice, not two similar posts of one feed.
+        Kept items are indexed; suppressed ones are recorded as posted so
+        later runs skip them without comparing again. With record=False the
+        items are only compared, not stored.
+        """
+        if not self.enabled or not items:
+            return items
+
+        now = time.time()
+        since = now - self.window
+        kept = []
+        suppressed = []
+        rows = []
+        batch = []
+        for content_id, content, source in items:
+            prints = fingerprints(content)
+            match = self._match(account, content_id, source, prints, since, batch)
+            if match is not None:
+                other_id, other_source, similarity = match
+                logging.info(
+                    f"Suppressed near-duplicate {source} item {content_id}: "
+                    f"{similarity:.1%} similar to {other_source} item {other_id}"
+                )
+                metrics.inc('items_near_duplicate_total', source=source)
+                suppressed.append((content_id, 'near_duplicate', content))
+                continue
+
+            kept.append((content_id, content, source))
+            for kind, value in prints:
+                batch.append((content_id, source, kind, value))
+                rows.append((content_id, account, kind, to_signed(value), source, now, self.buckets(value)))
+
+        if record:
+            self.database.add_fingerprints(rows, since)
+            if suppressed:
+                self.database.add_posted_many(suppressed)
+        return kept
+
+    def _match(self, account, content_id, source, prints, since, batch):
+        best = None
+        for kind, value in prints:
+            # Items earlier in the same batch are not in the table yet
+            candidates = [(cid, src, v) for cid, src, k, v in batch if k == kind]
+            candidates += self.database.fingerprint_candidates(account, kind, self.buckets(value), since)
+            for other_id, other_source, other in candidates:
+                if other_id == content_id or other_source == source:
+                    # Still pending from an earlier run, or an earlier item of the same feed
+                    continue
+                distance = hamming(value, other & ((1 << SIMHASH_BITS) - 1))
+                if distance <= self.max_distance and (best is None or distance < best[2]):
+                    best = (other_id, other_source, distance)
+        if best is None:
+            return None
+        return best[0], best[1], 1 - best[2] / SIMHASH_BITS
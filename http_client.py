@@ -0,0 +1,183 @@
+import json
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from circuit import CircuitOpenError, CircuitRegistry
+from config import Config
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class HttpResponse:
+    """Minimal response object shared by every fetcher.
+
+    A 304 answer is turned into a normal response carrying the cached body,
+    with not_modified set so callers can skip work on unchanged content.
+    validators holds the (etag, last_modified) pair a conditional request
+    left for the caller to save.
+    """
+
+    def __init__(self, url, status_code, content, headers, not_modified=False, raw=None, validators=None):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.not_modified = not_modified
+        self.validators = validators
+        self._raw = raw
+
+    def iter_content(self, chunk_size=16384):
+        """Yield the body in chunks; for streamed responses it is read lazily."""
+        if self._raw is not None:
+            yield from self._raw.iter_content(chunk_size)
+        elif self.content:
+            yield self.content
+
+    def close(self):
+        if self._raw is not None:
+            self._raw.close()
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error for url: {self.url}")
+
+
+class HttpClient:
+    def __init__(self, database=None, timeout=None, retries=None, backoff=None, pool_size=None, circuits=None):
+        self.database = database
+        # One breaker per host: while a host is down every request to it fails fast
+        self.circuits = circuits or CircuitRegistry(database)
+        self.timeout = timeout if timeout is not None else Config.HTTP_TIMEOUT
+        self.retries = retries if retries is not None else Config.HTTP_RETRIES
+        self.backoff = backoff if backoff is not None else Config.HTTP_BACKOFF
+        self.pool_size = pool_size if pool_size is not None else max(Config.EVENT_DETAIL_WORKERS, 4)
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session_for(self, url):
+        """Return the keep-alive session for the host of url."""
+        host = urlparse(url).netloc
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[host] = session
+            return session
+
+    def get(self, url, params=None, conditional=False, cache_body=True, stream=False, save_validators=True):
+        """GET url with retries and, if conditional, ETag/Last-Modified validation.
+
+        With cache_body=False only the validators are stored; a 304 then comes
+        back with an empty body and the caller must keep its own copy.
+        With stream=True the body is not read up front: use iter_content()
+        and close() instead of content. Streamed bodies are never cached.
+        With save_validators=False the new validators are not stored but
+        returned in response.validators, for the caller to save with
+        save_validators() once it has handled the body.
+        """
+        full_url = requests.Request('GET', url, params=params).prepare().url
+
+        headers = {}
+        cached = None
+        if conditional and self.database is not None:
+            cached = self.database.get_http_validators(full_url)
+            if cached:
+                etag, last_modified, _ = cached
+                if etag:
+                    headers['If-None-Match'] = etag
+                if last_modified:
+                    headers['If-Modified-Since'] = last_modified
+
+        host = urlparse(full_url).netloc
+        breaker = self.circuits.get(host)
+        if not breaker.allow():
+            metrics.inc('http_circuit_rejections_total', host=host)
+            raise CircuitOpenError(f"{host} is unhealthy, next try in {breaker.retry_in():.0f}s")
+        try:
+            response = self._request_with_retries(full_url, headers, stream)
+        except Exception:
+            breaker.record_failure()
+            raise
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+        if response.status_code == 304 and cached:
+            logging.info(f"Not modified: {full_url}")
+            # A streamed response holds its connection until closed
+            response.close()
+            return HttpResponse(full_url, 200, cached[2] or b'', response.headers, not_modified=True)
+
+        validators = None
+        if conditional and self.database is not None and response.status_code == 200:
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if etag or last_modified:
+                validators = (etag, last_modified)
+                if save_validators:
+                    body = response.content if cache_body and not stream else None
+                    self.database.save_http_validators(full_url, etag, last_modified, body)
+                    validators = None
+
+        if stream:
+            return HttpResponse(full_url, response.status_code, None, response.headers, raw=response,
+                                validators=validators)
+        return HttpResponse(full_url, response.status_code, response.content, response.headers,
+                            validators=validators)
+
+    def forget_validators(self, url, params=None):
+        """Drop the stored validators of url, so its next conditional request reads it in full."""
+        if self.database is not None:
+            self.database.delete_http_validators(requests.Request('GET', url, params=params).prepare().url)
+
+    def save_validators(self, url, etag, last_modified):
+        """Store validators returned by get(save_validators=False), without a body."""
+        if self.database is not None:
+            self.database.save_http_validators(url, etag, last_modified, None)
+
+    def _request_with_retries(self, url, headers, stream=False):
+        session = self.session_for(url)
+        host = urlparse(url).netloc
+        attempt = 0
+        while True:
+            try:
+                with metrics.timed('http_request', host=host):
+                    response = session.get(url, headers=headers, timeout=self.timeout, stream=stream)
+                metrics.inc('http_responses_total', host=host, status=response.status_code)
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.retries:
+                    return response
+                response.close()
+                logging.warning(f"HTTP {response.status_code} from {url}, retrying")
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.retries:
+                    raise
+                logging.warning(f"Request to {url} failed ({e}), retrying")
+            metrics.inc('http_retries_total', host=host)
+
+            attempt += 1
+            # Full jitter: sleep a random amount up to the exponential cap
+            time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
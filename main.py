@@ -1,13 +1,69 @@
+import time
+# Taken before the imports below, so the startup time includes them
+started = time.perf_counter()
+
 import argparse
+import logging
+from config import Config
 from bot import JyvaskylaBot
+import metrics
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--test", action="store_true", help="Run in test mode with more frequent updates")
+    parser.add_argument("--sync", action="store_true", help="Fetch sources one after another instead of concurrently")
+    parser.add_argument("--once", action="store_true", help="Run a single cycle, post what it found and exit")
+    parser.add_argument("--compact", action="store_true", help="Archive old posts, vacuum the database and report its size")
+    parser.add_argument("--backfill", nargs=2, metavar=("FROM", "TO"),
+                        help="Replay every feed from FROM up to TO (YYYY-MM-DD, TO not included)")
+    parser.add_argument("--dry-run", metavar="FILE", help="With --backfill, write the posts to FILE as NDJSON instead")
+    parser.add_argument("--post", action="store_true", help="With --backfill, post them, throttled")
+    parser.add_argument("--feeds", help="With --backfill, only these comma-separated feeds")
     args = parser.parse_args()
+    if args.backfill and bool(args.dry_run) == args.post:
+        parser.error("--backfill needs exactly one of --dry-run FILE or --post")
+
+    if args.compact:
+        from database import Database
+        from retention import RetentionManager
+
+        report = RetentionManager(Database()).run(full_vacuum=True)
+        for label in ('before', 'after'):
+            stats = report[label]
+            print(
+                f"{label:<7}{stats['file_bytes'] / 1024:>10.0f} KiB  {stats['pages']} pages, "
+                f"{stats['free_pages']} free, {stats['posted_rows']} posts "
+                f"({stats['posted_with_content']} with content)"
+            )
+        print(f"Archived {report['archived']} posts, dropped {report['dropped']}, "
+              f"deleted {report['outbox_deleted']} posted outbox rows")
+        raise SystemExit(0)
 
     if args.test:
-        Config.CHECK_INTERVAL = 1  # Check every minute in test mode
+        # Check every source every minute in test mode
+        Config.CHECK_INTERVAL = 1
+        Config.RSS_INTERVAL = Config.EVENTS_INTERVAL = Config.FACEBOOK_INTERVAL = 0
     
-    bot = JyvaskylaBot()
-    bot.run() 
\ No newline at end of file
+    bot = JyvaskylaBot(mode='sync' if args.sync else None)
+    startup = time.perf_counter() - started
+    metrics.observe('startup_duration_seconds', startup)
+    logging.info(f"Started in {startup:.2f}s")
+
+    if args.backfill:
+        from datetime import datetime
+        from backfill import Backfill
+
+        try:
+            start, end = (datetime.strptime(day, '%Y-%m-%d') for day in args.backfill)
+        except ValueError as e:
+            parser.error(f"--backfill: {e}")
+        feed_names = [name.strip() for name in args.feeds.split(',')] if args.feeds else None
+        known = [feed.name for feed in bot.feed_config.active_feeds()]
+        unknown = [name for name in feed_names or () if name not in known]
+        if unknown:
+            parser.error(f"--feeds: unknown feeds {', '.join(unknown)}; choose from {', '.join(known)}")
+        Backfill(bot).run(start, end, dry_run_path=args.dry_run, feed_names=feed_names)
+    elif args.once:
+        bot.run_once(startup_s=startup)
+    else:
+        bot.run()
@@ -0,0 +1,283 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PREFIX = 'jklbot_'
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    # Label values may come from the feeds file, so escape them as the exposition format requires
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+# Counters of the check cycle running in this context, see Registry.run_scope()
+_current_run = contextvars.ContextVar('metrics_run', default=None)
+
+
+class Registry:
+    """Counters and histograms in Prometheus text exposition format.
+
+    Kept dependency-free on purpose: the bot only needs a handful of series
+    and prometheus_client is not in requirements.txt.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        run = _current_run.get()
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + value
+            if run is not None:
+                run[(name, key)] = run.get((name, key), 0) + value
+
+    def observe(self, name, value, **labels):
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            key = _label_key(labels)
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    hist['buckets'][i] += 1
+            hist['sum'] += value
+            hist['count'] += 1
+            run = _current_run.get()
+            if run is not None:
+                run[(f"{name}_sum", key)] = run.get((f"{name}_sum", key), 0) + value
+                run[(f"{name}_count", key)] = run.get((f"{name}_count", key), 0) + 1
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    @contextmanager
+    def run_scope(self):
+        """Collect what is counted in this context, and the threads it hands work to, into a dict.
+
+        Jobs run concurrently, so a cycle summary cannot diff the global
+        counters without picking up the other jobs' work. Work submitted to
+        executors must carry the context along, see submit_in_context().
+        """
+        run = {}
+        token = _current_run.set(run)
+        try:
+            yield run
+        finally:
+            _current_run.reset(token)
+
+    @contextmanager
+    def timed(self, name, **labels):
+        """Observe the duration of the block; count an error if it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc(f"{name}_errors_total", **labels)
+            raise
+        finally:
+            self.observe(f"{name}_duration_seconds", time.perf_counter() - started, **labels)
+
+    def timed_method(self, name, **labels):
+        """Decorator form of timed(), labelled with the method name as operation."""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timed(name, operation=func.__name__, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full_name = PREFIX + name
+                if name in self._help:
+                    lines.append(f"# HELP {full_name} {self._help[name]}")
+                lines.append(f"# TYPE {full_name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{full_name}{_format_labels(key)} {value}")
+
+            for name, series in sorted(self._gauges.items()):
+                full_name = PREFIX + name
+                if name in self._help:
+                    lines.append(f"# HELP {full_name} {self._help[name]}")
+                lines.append(f"# TYPE {full_name} gauge")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{full_name}{_format_labels(key)} {value}")
+
+            for name, series in sorted(self._histograms.items()):
+                full_name = PREFIX + name
+                if name in self._help:
+                    lines.append(f"# HELP {full_name} {self._help[name]}")
+                lines.append(f"# TYPE {full_name} histogram")
+                for key, hist in sorted(series.items()):
+                    for bound, count in zip(self.buckets, hist['buckets']):
+                        lines.append(f"{full_name}_bucket{_format_labels(key, [('le', bound)])} {count}")
+                    lines.append(f"{full_name}_bucket{_format_labels(key, [('le', '+Inf')])} {hist['count']}")
+                    lines.append(f"{full_name}_sum{_format_labels(key)} {hist['sum']}")
+                    lines.append(f"{full_name}_count{_format_labels(key)} {hist['count']}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+set_gauge = registry.set_gauge
+describe = registry.describe
+run_scope = registry.run_scope
+timed = registry.timed
+timed_method = registry.timed_method
+
+HELP = {
+    'cycles_total': 'Check cycles run.',
+    'items_fetched_total': 'New items returned by each source.',
+    'items_deduplicated_total': 'Items dropped because they were already posted.',
+    'items_near_duplicate_total': 'News items dropped as near-duplicates of recent posts.',
+    'source_fetch_duration_seconds': 'Time to fetch one source.',
+    'source_fetch_errors_total': 'Source fetches that failed or timed out.',
+    'source_fetch_timeouts_total': 'Source fetches that timed out.',
+    'feed_entries_read_total': 'Feed entries parsed before reading stopped.',
+    'http_request_duration_seconds': 'Upstream HTTP request time per host.',
+    'http_request_errors_total': 'Upstream HTTP requests that raised.',
+    'http_responses_total': 'Upstream HTTP responses per host and status.',
+    'http_retries_total': 'Upstream HTTP requests retried.',
+    'http_circuit_rejections_total': 'Requests skipped because the host circuit was open.',
+    'circuit_opened_total': 'Times a circuit breaker opened.',
+    'cache_requests_total': 'Cache lookups per cache and result.',
+    'db_operation_duration_seconds': 'Database operation time.',
+    'db_operation_errors_total': 'Database operations that raised.',
+    'posts_total': 'Posting attempts per source and result.',
+    'status_post_duration_seconds': 'Time to post one status to Mastodon.',
+    'job_duration_seconds': 'Scheduled job run time.',
+    'job_errors_total': 'Scheduled job runs that raised.',
+    'job_skipped_total': 'Scheduled job runs skipped while the previous run was busy.',
+    'facebook_worker_restarts_total': 'Facebook worker processes stopped, per reason.',
+    'retention_rows_total': 'Posts archived or dropped by retention.',
+    'startup_duration_seconds': 'Time from process start to the first cycle.',
+    'posted_index_entries': 'Posted ids in the in-memory index.',
+    'posted_index_memory_bytes': 'Memory used by the posted-id index.',
+    'posted_index_expected_fp_rate': 'Expected false-positive rate of the posted-id index.',
+    'posted_index_observed_fp_rate': 'Share of index hits the database did not confirm.',
+}
+for _name, _text in HELP.items():
+    registry.describe(_name, _text)
+
+
+def submit_in_context(executor, fn, *args, **kwargs):
+    """executor.submit() that keeps the caller's run_scope() for fn."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def cycle_summary(run, duration):
+    """Summarize the counters collected by one run_scope(), grouped per source."""
+    def delta(name, **match):
+        total = 0
+        for (metric, key), value in run.items():
+            if metric != name:
+                continue
+            labels = dict(key)
+            if all(labels.get(k) == v for k, v in match.items()):
+                total += value
+        return total
+
+    sources = sorted({
+        dict(key).get('source') for metric, key in run
+        if metric == 'source_fetch_duration_seconds_count' and dict(key).get('source')
+    })
+
+    summary = {
+        'duration_s': round(duration, 3),
+        'sources': {},
+        'http_requests': delta('http_request_duration_seconds_count'),
+        'http_errors': delta('http_request_errors_total'),
+        'cache_hits': delta('cache_requests_total', result='hit'),
+        'cache_misses': delta('cache_requests_total', result='miss'),
+        'db_operations': delta('db_operation_duration_seconds_count'),
+        'db_seconds': round(delta('db_operation_duration_seconds_sum'), 3),
+    }
+    for source in sources:
+        summary['sources'][source] = {
+            'duration_s': round(delta('source_fetch_duration_seconds_sum', source=source), 3),
+            'items': delta('items_fetched_total', source=source),
+            'deduplicated': delta('items_deduplicated_total', source=source),
+            'near_duplicates': delta('items_near_duplicate_total', source=source),
+            'errors': delta('source_fetch_errors_total', source=source),
+        }
+    return summary
+
+
+def log_cycle_summary(run, duration, **extra):
+    """Log one structured line describing the cycle run_scope() collected in run."""
+    summary = cycle_summary(run, duration)
+    summary.update(extra)
+    logging.info(f"Cycle summary: {json.dumps(summary, sort_keys=True)}")
+    return summary
+
+
+class MetricsServer:
+    """Serve registry.render() on /metrics from a daemon thread."""
+
+    def __init__(self, port, host='127.0.0.1', metrics_registry=None):
+        self.port = port
+        self.host = host
+        self.registry = metrics_registry or registry
+        self._server = None
+
+    def start(self):
+        metrics_registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics_registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='metrics', daemon=True).start()
+        logging.info(f"Serving metrics on http://{self.host}:{self._server.server_address[1]}/metrics")
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
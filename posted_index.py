@@ -0,0 +1,114 @@
+import hashlib
+import math
+import sys
+
+
+class BloomFilter:
+    def __init__(self, capacity, fp_rate):
+        self.capacity = max(1, capacity)
+        self.fp_rate = fp_rate
+        self.num_bits = max(8, int(-self.capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Double hashing: k positions derived from two 64-bit halves of one digest
+        digest = hashlib.blake2b(str(key).encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def expected_fp_rate(self):
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+
+class PostedIndex:
+    """In-memory index of posted content ids.
+
+    Small tables are held in an exact set. Past bloom_threshold ids the index
+    switches to a Bloom filter: a miss is still a definite "not posted", while
+    a hit must be confirmed against SQLite by the caller (exact is False).
+    """
+
+    def __init__(self, bloom_threshold, fp_rate):
+        self.bloom_threshold = bloom_threshold
+        self.fp_rate = fp_rate
+        self._ids = set()
+        self._bloom = None
+        self.needs_rebuild = False
+        self.lookups = 0
+        self.fallback_lookups = 0
+        self.false_positives = 0
+
+    @property
+    def exact(self):
+        return self._bloom is None
+
+    def __len__(self):
+        return len(self._ids) if self._bloom is None else self._bloom.count
+
+    def load(self, content_ids):
+        content_ids = list(content_ids)
+        self.needs_rebuild = False
+        if len(content_ids) > self.bloom_threshold:
+            self._ids = set()
+            self._bloom = BloomFilter(len(content_ids) * 2, self.fp_rate)
+            for content_id in content_ids:
+                self._bloom.add(content_id)
+        else:
+            self._bloom = None
+            self._ids = set(content_ids)
+
+    def add(self, content_id):
+        if self._bloom is not None:
+            self._bloom.add(content_id)
+            # Past its capacity the filter's false-positive rate climbs, so
+            # ask the owner to rebuild it from the full id list
+            if self._bloom.count > self._bloom.capacity:
+                self.needs_rebuild = True
+            return
+
+        self._ids.add(content_id)
+        if len(self._ids) > self.bloom_threshold:
+            self.load(self._ids)
+
+    def might_contain(self, content_id):
+        self.lookups += 1
+        if self._bloom is None:
+            return content_id in self._ids
+        return content_id in self._bloom
+
+    def record_fallback(self, found):
+        self.fallback_lookups += 1
+        if not found:
+            self.false_positives += 1
+
+    def memory_bytes(self):
+        if self._bloom is not None:
+            return sys.getsizeof(self._bloom.bits)
+        return sys.getsizeof(self._ids) + sum(sys.getsizeof(content_id) for content_id in self._ids)
+
+    def stats(self):
+        if self._bloom is not None:
+            expected = self._bloom.expected_fp_rate()
+        else:
+            expected = 0.0
+        observed = self.false_positives / self.fallback_lookups if self.fallback_lookups else 0.0
+        return {
+            'mode': 'set' if self._bloom is None else 'bloom',
+            'entries': len(self),
+            'memory_bytes': self.memory_bytes(),
+            'expected_fp_rate': expected,
+            'observed_fp_rate': observed,
+            'lookups': self.lookups,
+            'fallback_lookups': self.fallback_lookups,
+        }
@@ -0,0 +1,168 @@
+import logging
+import random
+import threading
+import time
+
+import requests
+
+import metrics
+from config import Config
+from templates import thread_parent_id
+
+
+class MastodonPool:
+    """Mastodon clients for many accounts, sharing one HTTP session per instance."""
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session_for(self, instance):
+        with self._lock:
+            session = self._sessions.get(instance)
+            if session is None:
+                session = self._sessions[instance] = requests.Session()
+            return session
+
+    def client(self, instance, access_token):
+        from mastodon import Mastodon
+
+        return Mastodon(
+            access_token=access_token,
+            api_base_url=instance,
+            session=self.session_for(instance),
+            ratelimit_method='throw'  # PostingQueue paces and waits on the rate limit itself
+        )
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+class PostingQueue:
+    """Background worker that drains the persistent outbox to Mastodon.
+
+    Items are written to the outbox table before anything is posted, so a
+    crash never loses them. Each status is sent with its content id as the
+    Idempotency-Key, so retrying an item whose post went through just before
+    a crash returns the existing status instead of posting it twice.
+
+    An item whose id marks it as a thread part is posted as a reply to the
+    part before it, and waits while that part is still pending.
+    """
+
+    def __init__(self, mastodon, database, min_interval=None, max_attempts=None, retry_backoff=None, account=''):
+        self.mastodon = mastodon
+        self.database = database
+        self.account = account
+        self.min_interval = min_interval if min_interval is not None else Config.POST_MIN_INTERVAL
+        self.max_attempts = max_attempts if max_attempts is not None else Config.POST_MAX_ATTEMPTS
+        self.retry_backoff = retry_backoff if retry_backoff is not None else Config.POST_RETRY_BACKOFF
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def enqueue(self, items):
+        """Add (content_id, content, source) items to the outbox and wake the worker."""
+        added = self.database.enqueue_posts(items, self.account)
+        if added:
+            logging.info(f"Queued {added} new posts{f' for {self.account}' if self.account else ''}")
+            self._wakeup.set()
+        return added
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            name = f"posting-queue-{self.account}" if self.account else 'posting-queue'
+            self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def drain(self):
+        """Post every item that is due now, in the calling thread."""
+        while not self._stopping.is_set():
+            item = self.database.next_outbox_item(time.time(), self.account)
+            if item is None:
+                return
+            self._post(*item)
+            self._pace()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self.drain()
+            except Exception as e:
+                logging.error(f"Posting queue error: {e}")
+
+            self._wakeup.clear()
+            next_due = self.database.next_outbox_due(self.account)
+            timeout = None if next_due is None else max(0, next_due - time.time())
+            self._wakeup.wait(timeout)
+
+    def _post(self, content_id, content, source, attempts):
+        from mastodon import MastodonAPIError, MastodonNetworkError, MastodonRatelimitError, MastodonServerError
+
+        in_reply_to_id = None
+        parent_id = thread_parent_id(content_id)
+        if parent_id is not None:
+            parent = self.database.outbox_status(parent_id)
+            if parent is not None and parent[0] == 'pending':
+                self.database.reschedule_outbox(content_id, attempts, max(time.time(), parent[2]) + 1,
+                                                'waiting for the post it replies to')
+                return
+            if parent is not None and parent[0] == 'posted':
+                in_reply_to_id = parent[1]
+
+        started = time.perf_counter()
+        try:
+            try:
+                status = self.mastodon.status_post(content, in_reply_to_id=in_reply_to_id, idempotency_key=content_id)
+            finally:
+                metrics.observe('status_post_duration_seconds', time.perf_counter() - started, source=source)
+            self.database.mark_outbox_posted(content_id, source, content, str(status['id']))
+            metrics.inc('posts_total', source=source, result='posted')
+            logging.info(f"Posted new {source}: {content[:100]}...")
+        except MastodonRatelimitError:
+            metrics.inc('posts_total', source=source, result='rate_limited')
+            wait = max(1, self.mastodon.ratelimit_reset - time.time())
+            logging.warning(f"Mastodon rate limit reached, retrying {source} in {wait:.0f}s")
+            self.database.reschedule_outbox(content_id, attempts, time.time() + wait, 'rate limited')
+        except (MastodonNetworkError, MastodonServerError) as e:
+            metrics.inc('posts_total', source=source, result='error')
+            self._retry_later(content_id, source, attempts + 1, e)
+        except MastodonAPIError as e:
+            metrics.inc('posts_total', source=source, result='error')
+            # 4xx answers (validation, auth) will not succeed on retry
+            logging.error(f"Error posting {source} to Mastodon, giving up: {e}")
+            self.database.mark_outbox_failed(content_id, attempts + 1, str(e))
+        except Exception as e:
+            metrics.inc('posts_total', source=source, result='error')
+            self._retry_later(content_id, source, attempts + 1, e)
+
+    def _retry_later(self, content_id, source, attempts, error):
+        if attempts >= self.max_attempts:
+            logging.error(f"Error posting {source} to Mastodon after {attempts} attempts, giving up: {error}")
+            self.database.mark_outbox_failed(content_id, attempts, str(error))
+            return
+
+        delay = random.uniform(0.5, 1.5) * self.retry_backoff * (2 ** (attempts - 1))
+        logging.warning(f"Error posting {source} to Mastodon, retrying in {delay:.0f}s: {error}")
+        self.database.reschedule_outbox(content_id, attempts, time.time() + delay, str(error))
+
+    def _pace(self):
+        """Spread the remaining X-RateLimit budget over the time left in the window."""
+        remaining = getattr(self.mastodon, 'ratelimit_remaining', None)
+        reset = getattr(self.mastodon, 'ratelimit_reset', None)
+        delay = self.min_interval
+        if remaining is not None and reset is not None:
+            until_reset = reset - time.time()
+            if until_reset > 0:
+                delay = max(delay, until_reset / max(remaining, 1))
+        self._stopping.wait(delay)
@@ -0,0 +1,71 @@
+import hashlib
+import time
+
+from config import Config
+
+# (reminder type, hours before the event it becomes due, hours before the event it expires)
+REMINDER_WINDOWS = (
+    ('event_24h', 24, 23),
+    ('event_6h', 6, 5),
+)
+
+
+def reminder_id(event_id, reminder_type):
+    content_id = hashlib.md5(f"{event_id}".encode()).hexdigest()
+    suffix = reminder_type.split('_', 1)[1]
+    return hashlib.md5(f"{content_id}_{suffix}".encode()).hexdigest()
+
+
+class ReminderScheduler:
+    """Event reminders indexed by due time in the reminders table.
+
+    Reminders are scheduled when events are synced, so finding the due ones
+    is an index range scan instead of a pass over every upcoming event, and
+    the bot can sleep until next_due(). A reminder that was not sent before
+    it expired (e.g. the bot was down) is marked missed rather than sent late.
+    One that could not be rendered (e.g. its event page failed) is retried
+    after retry_backoff seconds, doubling with every attempt.
+    """
+
+    def __init__(self, database, retry_backoff=None):
+        self.database = database
+        self.retry_backoff = retry_backoff if retry_backoff is not None else Config.REMINDER_RETRY_BACKOFF
+
+    def schedule_events(self, events):
+        """Schedule reminders for (event_id, start_ts) pairs."""
+        rows = []
+        for event_id, start_ts in events:
+            for reminder_type, due_hours, expire_hours in REMINDER_WINDOWS:
+                rows.append((
+                    reminder_id(event_id, reminder_type),
+                    str(event_id),
+                    reminder_type,
+                    start_ts - due_hours * 3600,
+                    start_ts - expire_hours * 3600,
+                    start_ts,
+                ))
+        self.database.schedule_reminders(rows)
+
+    def due(self, now=None):
+        """Return pending (reminder_id, event_id, reminder_type, start_ts) rows that are due now."""
+        now = now if now is not None else time.time()
+        self.database.expire_reminders(now)
+        return self.database.due_reminders(now)
+
+    def between(self, start_ts, end_ts):
+        """(reminder_id, event_id, reminder_type, start_ts) rows due in [start_ts, end_ts), whatever their status."""
+        return self.database.reminders_due_between(start_ts, end_ts)
+
+    def mark_queued(self, reminder_ids):
+        self.database.mark_reminders(reminder_ids, 'queued')
+
+    def retry_later(self, reminder_ids, now=None):
+        now = now if now is not None else time.time()
+        self.database.retry_reminders_later(reminder_ids, now, self.retry_backoff)
+
+    def next_due(self):
+        """Timestamp of the next pending reminder that is not backing off, or None."""
+        return self.database.next_reminder_due()
+
+    def prune(self):
+        self.database.delete_orphan_reminders()
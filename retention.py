@@ -0,0 +1,110 @@
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+
+import metrics
+from config import Config
+
+BATCH_SIZE = 1000
+
+
+def parse_source_days(value):
+    """Parse 'source=days,source=days' into a dict."""
+    ttls = {}
+    for part in (value or '').split(','):
+        if part.strip():
+            source, days = part.split('=', 1)
+            ttls[source.strip()] = float(days)
+    return ttls
+
+
+class RetentionManager:
+    """Archive and prune old posted_content rows, then give the space back.
+
+    A row older than its source's TTL is appended to a gzipped NDJSON file in
+    archive_dir, one file per month. Its content is then cleared, but the row
+    itself is kept, because dedup still needs the id. Rows from drop_sources
+    are deleted outright. Their ids cannot come back: reminders are only
+    made for upcoming events, and a weekly digest id names its week.
+    """
+
+    def __init__(self, database, archive_dir=None, default_days=None, source_days=None, drop_sources=None,
+                 vacuum_pages=None):
+        self.database = database
+        self.archive_dir = archive_dir or Config.RETENTION_ARCHIVE_DIR
+        self.default_days = default_days if default_days is not None else Config.RETENTION_DAYS
+        self.source_days = source_days if source_days is not None else parse_source_days(Config.RETENTION_SOURCE_DAYS)
+        if drop_sources is None:
+            drop_sources = [source.strip() for source in Config.RETENTION_DROP_SOURCES.split(',') if source.strip()]
+        self.drop_sources = set(drop_sources)
+        self.vacuum_pages = vacuum_pages if vacuum_pages is not None else Config.RETENTION_VACUUM_PAGES
+
+    def run(self, now=None, full_vacuum=False):
+        """Prune expired rows; returns storage stats before and after and what was done."""
+        now = now or datetime.now()
+        before = self.database.storage_stats()
+
+        archived = stripped = dropped = 0
+        # Sources with their own TTL first, then everything else with the default
+        policies = [(source, days) for source, days in self.source_days.items()]
+        policies.append((None, self.default_days))
+        for source, days in policies:
+            if days <= 0:
+                continue
+            cutoff = now - timedelta(days=days)
+            exclude = list(self.source_days) if source is None else []
+            while True:
+                rows = self.database.expired_posted(cutoff, source, exclude, BATCH_SIZE)
+                if not rows:
+                    break
+                self.archive(rows, now)
+                drop = [row[0] for row in rows if row[1] in self.drop_sources]
+                strip = [row[0] for row in rows if row[1] not in self.drop_sources]
+                self.database.strip_posted_content(strip)
+                self.database.delete_posted(drop)
+                archived += len(rows)
+                stripped += len(strip)
+                dropped += len(drop)
+
+        outbox_deleted = 0
+        if self.default_days > 0:
+            # posted_content already holds what the outbox posted
+            cutoff = (now - timedelta(days=self.default_days)).timestamp()
+            outbox_deleted = self.database.delete_posted_outbox(cutoff)
+        if dropped:
+            self.database.load_posted_index()
+
+        self.database.enable_incremental_vacuum()
+        self.database.incremental_vacuum(None if full_vacuum else self.vacuum_pages)
+        after = self.database.storage_stats()
+
+        metrics.inc('retention_rows_total', archived, action='archived')
+        metrics.inc('retention_rows_total', dropped, action='dropped')
+        logging.info(
+            f"Retention: archived {archived} posts ({stripped} kept as ids, {dropped} dropped), "
+            f"deleted {outbox_deleted} posted outbox rows, "
+            f"database {before['file_bytes'] / 1024:.0f} KiB -> {after['file_bytes'] / 1024:.0f} KiB"
+        )
+        return {
+            'before': before,
+            'after': after,
+            'archived': archived,
+            'stripped': stripped,
+            'dropped': dropped,
+            'outbox_deleted': outbox_deleted,
+        }
+
+    def archive(self, rows, now):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"posted-{now:%Y-%m}.ndjson.gz")
+        # Appending adds a gzip member; zcat and gzip.open read them as one stream
+        with gzip.open(path, 'at', encoding='utf-8') as f:
+            for content_id, source, content, posted_date in rows:
+                f.write(json.dumps({
+                    'content_id': content_id,
+                    'source': source,
+                    'content': content,
+                    'posted_date': str(posted_date),
+                }, ensure_ascii=False) + '\n')
@@ -0,0 +1,250 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import metrics
+
+CRON_FIELDS = (
+    ('minute', 0, 59),
+    ('hour', 0, 23),
+    ('day', 1, 31),
+    ('month', 1, 12),
+    ('weekday', 0, 7),
+)
+
+
+def _parse_cron_field(field, low, high):
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/', 1)
+            step = int(step)
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(value) for value in part.split('-', 1))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f"Cron field {field!r} is out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """Five-field cron expression (minute hour day month weekday).
+
+    Weekdays run from 0 = Sunday, as in crontab; 7 is also accepted for
+    Sunday. Like cron, when both day and weekday are restricted a time
+    matches if either does.
+    """
+
+    def __init__(self, expression, timezone):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression {expression!r} needs five fields")
+        self.expression = expression
+        self.timezone = timezone
+        parsed = [_parse_cron_field(field, low, high) for field, (_, low, high) in zip(fields, CRON_FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = {weekday % 7 for weekday in weekdays}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def _day_matches(self, dt):
+        # datetime.weekday() has Monday = 0, cron has Sunday = 0
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, timestamp):
+        """Return the first matching time strictly after timestamp, as a timestamp."""
+        dt = datetime.fromtimestamp(timestamp, self.timezone).replace(tzinfo=None)
+        dt = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Walk forward a field at a time; four years covers every valid expression
+        limit = dt + timedelta(days=366 * 4)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+            elif dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return self.timezone.localize(dt).timestamp()
+        raise ValueError(f"Cron expression {self.expression!r} never matches")
+
+
+class Job:
+    """A named task run by the Scheduler.
+
+    interval (seconds) or cron decides when the job runs next; jitter adds
+    a random delay of up to that many seconds to every run, so jobs sharing
+    an upstream host don't fire in lockstep. next_due, if given, is asked
+    for an earlier wakeup (for example the next event reminder), but runs
+    triggered that way are at least min_spacing seconds apart. A cron job
+    with catch_up set also runs at startup if its last slot was missed
+    less than catch_up seconds ago. With adaptive (an AdaptiveInterval),
+    run returns whether it found anything new and the interval follows.
+    """
+
+    def __init__(self, name, run, interval=None, cron=None, jitter=0, next_due=None,
+                 min_spacing=5, catch_up=None, run_at_start=False, adaptive=None):
+        if (interval is None) == (cron is None):
+            raise ValueError(f"Job {name} needs either an interval or a cron schedule")
+        self.name = name
+        self.run = run
+        self.interval = interval
+        self.cron = cron
+        self.jitter = jitter
+        self.next_due = next_due
+        self.min_spacing = min_spacing
+        self.catch_up = catch_up
+        self.run_at_start = run_at_start
+        self.adaptive = adaptive
+        self.next_run = None
+        self.last_started = None
+        self.future = None
+
+    def first_run(self, now):
+        if self.run_at_start:
+            return now
+        if self.cron is not None and self.catch_up and self.cron.next_after(now - self.catch_up) <= now:
+            return now
+        return self.following_run(now)
+
+    def following_run(self, now):
+        if self.cron is not None:
+            planned = self.cron.next_after(now)
+        else:
+            planned = now + self.interval
+        return planned + random.uniform(0, self.jitter)
+
+    def due_at(self):
+        due = self.next_run
+        # While a run is in progress only its regular slot counts; the hint
+        # is looked at again once the run finishes
+        if self.next_due is not None and not self.running:
+            hint = self.next_due()
+            if hint is not None:
+                if self.last_started is not None:
+                    hint = max(hint, self.last_started + self.min_spacing)
+                due = min(due, hint)
+        return due
+
+    @property
+    def running(self):
+        return self.future is not None and not self.future.done()
+
+
+class AdaptiveInterval:
+    """Polling interval that stretches while a feed is quiet and shrinks while it changes.
+
+    Each quiet run multiplies the interval by backoff, up to max_factor times
+    the base; each run that found something halves it, down to min_factor
+    times the base.
+    """
+
+    def __init__(self, base, min_factor=0.5, max_factor=4, backoff=1.5):
+        self.base = base
+        self.minimum = base * min(min_factor, 1)
+        self.maximum = base * max(max_factor, 1)
+        self.backoff = backoff
+        self.current = base
+
+    def record(self, changed):
+        if changed:
+            self.current = max(self.minimum, self.current / 2)
+        else:
+            self.current = min(self.maximum, self.current * self.backoff)
+        return self.current
+
+
+class Scheduler:
+    """Run jobs in worker threads exactly when they are due.
+
+    The loop sleeps until the earliest due job instead of polling, and a
+    job whose previous run is still going is skipped rather than started
+    twice; it simply waits for its next slot.
+    """
+
+    def __init__(self, max_workers=4):
+        self.jobs = []
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+
+    def add(self, job):
+        self.jobs.append(job)
+        return job
+
+    def start(self, now=None):
+        now = now if now is not None else time.time()
+        for job in self.jobs:
+            job.next_run = job.first_run(now)
+            logging.info(f"Scheduled {job.name}, first run at {datetime.fromtimestamp(job.next_run):%Y-%m-%d %H:%M:%S}")
+
+    def run_pending(self, now=None):
+        now = now if now is not None else time.time()
+        for job in self.jobs:
+            if job.due_at() > now:
+                continue
+            job.next_run = job.following_run(now)
+            if job.running:
+                metrics.inc('job_skipped_total', job=job.name)
+                logging.warning(f"Skipping {job.name}: the previous run is still in progress")
+                continue
+            job.last_started = now
+            job.future = self.executor.submit(self._run_job, job)
+
+    def seconds_until_next(self, now=None):
+        now = now if now is not None else time.time()
+        if not self.jobs:
+            return None
+        return max(0, min(job.due_at() for job in self.jobs) - now)
+
+    def wake(self):
+        """Re-evaluate due times now, e.g. after new reminders were scheduled."""
+        self._wakeup.set()
+
+    def run_forever(self):
+        self.start()
+        while not self._stopping.is_set():
+            # Clear first so a job finishing during run_pending still wakes the loop
+            self._wakeup.clear()
+            self.run_pending()
+            self._wakeup.wait(self.seconds_until_next())
+
+    def _adapt(self, job, changed):
+        interval = job.adaptive.record(changed)
+        if abs(interval - job.interval) >= 1:
+            logging.info(f"{job.name} {'changed' if changed else 'unchanged'}, polling every {interval / 60:.1f} min")
+        job.interval = interval
+        # The slot planned when this run started used the old interval
+        job.next_run = job.last_started + interval + random.uniform(0, job.jitter)
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run_job(self, job):
+        try:
+            with metrics.timed('job', job=job.name):
+                changed = job.run()
+            if job.adaptive is not None:
+                self._adapt(job, bool(changed))
+        except Exception as e:
+            logging.error(f"Job {job.name} failed: {e}")
+        finally:
+            # The job may have produced an earlier next_due, e.g. new reminders
+            self._wakeup.set()
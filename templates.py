@@ -0,0 +1,194 @@
+import logging
+import re
+import string
+import threading
+from collections import OrderedDict
+
+import metrics
+from config import Config
+
+# Mastodon counts every link as this many characters, however long it is
+URL_LENGTH = 23
+URL_PATTERN = re.compile(r'https?://\S+')
+ELLIPSIS = '...'
+# Content ids of the replies in a thread are the first post's id plus #2, #3, ...
+THREAD_SEPARATOR = '#'
+
+
+def post_length(text):
+    """Length of text as Mastodon counts it against the character limit."""
+    return len(URL_PATTERN.sub('x' * URL_LENGTH, text))
+
+
+def truncate(text, limit):
+    """Shorten text to at most limit characters, at a word boundary when one is near."""
+    if post_length(text) <= limit:
+        return text
+    if limit <= len(ELLIPSIS):
+        return ''
+    cut = text[:limit - len(ELLIPSIS)]
+    space = cut.rfind(' ')
+    if space > len(cut) * 0.8:
+        cut = cut[:space]
+    while cut and post_length(cut) + len(ELLIPSIS) > limit:
+        cut = cut[:-1]
+    return cut.rstrip() + ELLIPSIS
+
+
+def thread_part_id(content_id, part):
+    return content_id if part == 1 else f"{content_id}{THREAD_SEPARATOR}{part}"
+
+
+def thread_parent_id(content_id):
+    """The id of the post a thread part replies to, or None for a standalone post."""
+    base, separator, part = content_id.rpartition(THREAD_SEPARATOR)
+    if not separator or not part.isdigit():
+        return None
+    return thread_part_id(base, int(part) - 1)
+
+
+class Template:
+    """A post layout, parsed once into literal text and {field} slots.
+
+    The elastic fields are shortened, in the order given, until the whole
+    post fits the budget. Bump version whenever text changes, so cached
+    renders of the old layout are not served.
+    """
+
+    def __init__(self, name, text, version=1, elastic=()):
+        self.name = name
+        self.version = version
+        self.elastic = (elastic,) if isinstance(elastic, str) else tuple(elastic)
+        self._parts = []
+        for literal, field, spec, conversion in string.Formatter().parse(text):
+            if spec or conversion:
+                raise ValueError(f"Template {name!r}: format the value of {field!r} before rendering")
+            self._parts.append((literal, field))
+        self.fields = {field for _, field in self._parts if field is not None}
+        for field in self.elastic:
+            if field not in self.fields:
+                raise ValueError(f"Template {name!r} has no field {field!r}")
+
+    def render(self, values, budget):
+        values = {field: str(values[field]) for field in self.fields}
+        for field in self.elastic:
+            if post_length(self._join(values)) <= budget:
+                break
+            fixed = post_length(self._join(dict(values, **{field: ''})))
+            values[field] = truncate(values[field], budget - fixed)
+        return self._join(values)
+
+    def _join(self, values):
+        out = []
+        for literal, field in self._parts:
+            out.append(literal)
+            if field is not None:
+                out.append(values[field])
+        return ''.join(out)
+
+
+TEMPLATES = (
+    Template('news', "{title}\n{link}", elastic='title'),
+    Template('facebook', "{text}", elastic='text'),
+    Template('test', "TEST: {title}\n\n{link}\n\n#Test", elastic='title'),
+    Template('event_24h', "Tapahtuma alkaa huomenna:\n\n{title}\n{time}\n\n{description}\n\n{url}",
+             elastic=('description', 'title')),
+    Template('event_6h', "Tapahtuma alkaa pian:\n\n{title}\n{time}\n\n{description}\n\n{url}",
+             elastic=('description', 'title')),
+    Template('weekly', "Tämän viikon tapahtumat:\n\n{events}\n\nhttps://kalenteri.jyvaskyla.fi"),
+    Template('weekly_more', "Lisää tämän viikon tapahtumia ({part}/{parts}):\n\n{events}"),
+    Template('weekly_event', "- {title}, {time}", elastic='title'),
+)
+
+
+class PostRenderer:
+    """Render posts from the compiled templates within the character limit.
+
+    Rendered text is cached by (template, version, key), e.g. an event id,
+    and reused as long as the values and budget are unchanged, so the same
+    events are not rendered again every cycle.
+
+    Posts rendered without hashtags are tagged later by each account, so
+    hashtag_reserve characters are kept free for the longest suffix.
+    """
+
+    def __init__(self, limit=None, cache_size=None, templates=TEMPLATES):
+        self.limit = limit if limit is not None else Config.POST_MAX_CHARS
+        self.cache_size = cache_size if cache_size is not None else Config.RENDER_CACHE_SIZE
+        self.templates = {template.name: template for template in templates}
+        self.hashtag_reserve = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def reserve_for(self, hashtag_sets):
+        """Leave room for the longest of hashtag_sets when rendering untagged posts."""
+        self.hashtag_reserve = max((post_length(f"\n\n{hashtags}") for hashtags in hashtag_sets if hashtags),
+                                   default=0)
+
+    def budget(self, hashtags):
+        if hashtags:
+            return self.limit - post_length(f"\n\n{hashtags}")
+        return self.limit - self.hashtag_reserve
+
+    def render(self, name, values, hashtags=None, key=None, budget=None):
+        """Render the named template, leaving room for hashtags, which the caller appends."""
+        template = self.templates[name]
+        budget = budget if budget is not None else self.budget(hashtags)
+        if key is None:
+            return self._render(template, values, budget)
+
+        cache_key = (name, template.version, key)
+        with self._lock:
+            entry = self._cache.get(cache_key)
+            if entry is not None:
+                self._cache.move_to_end(cache_key)
+        if entry is not None and entry[0] == values and entry[1] == budget:
+            metrics.inc('cache_requests_total', cache='render', result='hit')
+            return entry[2]
+
+        metrics.inc('cache_requests_total', cache='render', result='miss')
+        text = self._render(template, values, budget)
+        with self._lock:
+            self._cache[cache_key] = (dict(values), budget, text)
+            self._cache.move_to_end(cache_key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return text
+
+    @staticmethod
+    def _render(template, values, budget):
+        text = template.render(values, budget)
+        if post_length(text) > budget:
+            # Its fixed parts alone are too long: cut the post rather than have Mastodon reject it forever
+            logging.warning(f"{template.name} post is {post_length(text)} characters, cutting it to {budget}")
+            text = truncate(text, budget)
+        return text
+
+    def render_thread(self, name, more_name, lines, values=None, hashtags=None):
+        """Fit lines into the named template, continuing in more_name replies when they do not fit.
+
+        Returns the text of each post in order. Only the first post leaves
+        room for hashtags; replies are posted without them.
+        """
+        values = dict(values or {})
+        first, more = self.templates[name], self.templates[more_name]
+        # Room for the lines in each post, with a generous part number in the replies
+        first_room = self.budget(hashtags) - post_length(first.render(dict(values, events=''), self.limit))
+        more_room = self.limit - post_length(more.render(dict(values, events='', part=99, parts=99), self.limit))
+
+        chunks = [[]]
+        room = first_room
+        for line in lines:
+            line = truncate(line, min(first_room, more_room))
+            cost = post_length(line) + (1 if chunks[-1] else 0)
+            if chunks[-1] and cost > room:
+                chunks.append([])
+                room = more_room
+                cost = post_length(line)
+            chunks[-1].append(line)
+            room -= cost
+
+        posts = [first.render(dict(values, events='\n'.join(chunks[0])), self.limit)]
+        for part, chunk in enumerate(chunks[1:], start=2):
+            posts.append(more.render(dict(values, events='\n'.join(chunk), part=part, parts=len(chunks)), self.limit))
+        return posts
@@ -0,0 +1,220 @@
+import sys
+import os
+import json
+import time
+import shutil
+import logging
+import argparse
+import resource
+import subprocess
+import tempfile
+import statistics
+from datetime import timedelta
+
+import requests
+from mastodon import Mastodon
+
+# Add the parent directory to the Python path so we can import the main module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot import JyvaskylaBot
+from database import Database
+from http_client import HttpClient
+from content_fetchers import ContentFetcher
+from feeds import default_feed_config
+from fixture_server import FixtureServer
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+MAIN_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+
+
+class ReplayHttpClient(HttpClient):
+    """HttpClient that sends every upstream request to the fixture server."""
+
+    def __init__(self, server, database):
+        super().__init__(database)
+        self.server = server
+
+    def get(self, url, params=None, **kwargs):
+        if params:
+            url = requests.Request('GET', url, params=params).prepare().url
+        return super().get(self.server.rewrite(url), **kwargs)
+
+
+class ReplayBot(JyvaskylaBot):
+    """The real bot wired to the fixture server, without Facebook."""
+
+    def __init__(self, server, database):
+        self.server = server
+        fetcher = ContentFetcher(database, http_client=ReplayHttpClient(server, database))
+        fetcher.enable_event_notifications = True
+        feed_config = default_feed_config(server.base_url, 'benchmark')
+        super().__init__(database=database, content_fetcher=fetcher, feed_config=feed_config)
+        self.posting_queue.min_interval = 0
+
+    def mastodon_client(self, account):
+        return Mastodon(
+            access_token=account.access_token,
+            api_base_url=account.instance,
+            mastodon_version='4.2.0',
+            ratelimit_method='throw'
+        )
+
+    def build_sources(self, now):
+        # Always include the Monday digest so results don't depend on the weekday.
+        # facebook_scraper talks to facebook.com directly and cannot be replayed.
+        monday = now - timedelta(days=now.weekday())
+        return [source for source in super().build_sources(monday) if source.name != 'facebook']
+
+
+class Scenario:
+    def __init__(self, name, run):
+        self.name = name
+        self.run = run
+
+
+def scenarios(server):
+    def website(bot):
+        bot.content_fetcher.fetch_jyvaskyla_website()
+
+    def event_details(bot):
+        bot.content_fetcher.fetch_event_details("https://kalenteri.jyvaskyla.fi/fi/tapahtuma/41000")
+
+    def events(bot):
+        bot.content_fetcher.fetch_events()
+
+    def weekly_events(bot):
+        bot.content_fetcher.fetch_weekly_events()
+
+    def startup(bot):
+        # A fresh interpreter loading everything main.py imports before its first cycle
+        subprocess.run([sys.executable, MAIN_FILE, '--help'], check=True, stdout=subprocess.DEVNULL)
+
+    def full_cycle(bot):
+        bot.check_and_post_updates()
+        bot.posting_queue.drain()
+
+    return [
+        Scenario('startup', startup),
+        Scenario('fetch_jyvaskyla_website', website),
+        Scenario('fetch_event_details', event_details),
+        Scenario('fetch_events', events),
+        Scenario('fetch_weekly_events', weekly_events),
+        Scenario('check_and_post_updates', full_cycle),
+    ]
+
+
+def percentile(values, pct):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[pct - 1]
+
+
+def peak_rss_kib():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 if sys.platform == 'darwin' else peak
+
+
+def run_scenario(server, scenario, iterations, warm):
+    workdir = tempfile.mkdtemp(prefix='jklbot-bench-')
+    latencies = []
+    requests_made = 0
+    bot = None
+    try:
+        for i in range(iterations):
+            # Cold runs start every iteration from an empty database and caches
+            if bot is None or not warm:
+                db_file = os.path.join(workdir, f"bench-{i}.db")
+                bot = ReplayBot(server, Database(db_file))
+                if warm:
+                    scenario.run(bot)
+
+            server.reset_counts()
+            started = time.perf_counter()
+            scenario.run(bot)
+            latencies.append((time.perf_counter() - started) * 1000)
+            requests_made += sum(count for kind, count in server.requests.items() if kind != 'mastodon')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p90_ms': round(percentile(latencies, 90), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'requests': round(requests_made / iterations, 2),
+        'peak_rss_kib': round(peak_rss_kib()),
+    }
+
+
+def check_regressions(results, baseline, tolerance, slack_ms):
+    failures = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if not expected:
+            continue
+        # The absolute slack keeps millisecond-scale scenarios from flapping on timer noise
+        if result['p50_ms'] > expected['p50_ms'] * (1 + tolerance) + slack_ms:
+            failures.append(f"{name}: p50 {result['p50_ms']:.1f} ms > baseline {expected['p50_ms']:.1f} ms")
+        # Reminders falling in or out of their window can move the count by one
+        if result['requests'] > expected['requests'] + 1:
+            failures.append(f"{name}: {result['requests']:.1f} requests > baseline {expected['requests']:.1f}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fetchers and the check cycle against recorded fixtures")
+    parser.add_argument("--iterations", type=int, default=10, help="Runs per scenario")
+    parser.add_argument("--warm", action="store_true", help="Reuse the database and caches between runs")
+    parser.add_argument("--only", help="Run only the scenario with this name")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Write the results to {os.path.basename(BASELINE_FILE)}")
+    parser.add_argument("--check", action="store_true", help="Exit with an error if results regress past the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p50 slowdown relative to the baseline")
+    parser.add_argument("--slack-ms", type=float, default=10, help="Allowed absolute p50 slowdown on top of --tolerance")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    mode = 'warm' if args.warm else 'cold'
+
+    server = FixtureServer().start()
+    results = {}
+    try:
+        print(f"{'scenario':<26}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'requests':>10}{'peak RSS MiB':>14}")
+        for scenario in scenarios(server):
+            if args.only and scenario.name != args.only:
+                continue
+            result = run_scenario(server, scenario, args.iterations, args.warm)
+            results[scenario.name] = result
+            print(
+                f"{scenario.name:<26}{result['p50_ms']:>9.1f}{result['p90_ms']:>9.1f}{result['p99_ms']:>9.1f}"
+                f"{result['requests']:>10.1f}{result['peak_rss_kib'] / 1024:>14.1f}"
+            )
+    finally:
+        server.stop()
+
+    baseline = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE) as f:
+            baseline = json.load(f)
+
+    if args.save_baseline:
+        baseline[mode] = {**baseline.get(mode, {}), **results}
+        with open(BASELINE_FILE, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Saved {mode} baseline to {BASELINE_FILE}")
+
+    if args.check:
+        if not baseline.get(mode):
+            # Latencies depend on the machine, so there is no shared baseline to compare with
+            print(f"No {mode} baseline on this machine yet, save one first with --save-baseline")
+            sys.exit(1)
+        failures = check_regressions(results, baseline[mode], args.tolerance, args.slack_ms)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import sys
+import os
+import time
+import tracemalloc
+import argparse
+
+# Add the parent directory to the Python path so we can import the main module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extractors import EXTRACTORS
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'event_pages')
+CHUNK_SIZE = 16384
+
+
+def load_fixtures():
+    fixtures = {}
+    for name in sorted(os.listdir(FIXTURE_DIR)):
+        if name.endswith('.html'):
+            with open(os.path.join(FIXTURE_DIR, name), 'rb') as f:
+                fixtures[name] = f.read()
+    return fixtures
+
+
+def chunked(data):
+    # Mimic response.iter_content() so the streaming extractor can stop early
+    for i in range(0, len(data), CHUNK_SIZE):
+        yield data[i:i + CHUNK_SIZE]
+
+
+def bench(extractor, data, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        extractor.extract(chunked(data), 'fixture')
+    elapsed = (time.perf_counter() - started) / rounds
+
+    tracemalloc.start()
+    result = extractor.extract(chunked(data), 'fixture')
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare event page extractors on saved fixture pages")
+    parser.add_argument("--rounds", type=int, default=50, help="Parses per extractor and page")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures()
+    print(f"{'page':<26}{'extractor':<14}{'ms/page':>10}{'peak KiB':>12}  same as bs4")
+
+    for name, data in fixtures.items():
+        results = []
+        for extractor_name, extractor_class in EXTRACTORS.items():
+            elapsed, peak, result = bench(extractor_class(), data, args.rounds)
+            # Compared with bs4's result, which is None for a page without a usable title
+            results.append(result)
+            baseline = results[0]
+            print(f"{name:<26}{extractor_name:<14}{elapsed * 1000:>10.2f}{peak / 1024:>12.1f}  {result == baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import sys
+import os
+import re
+import time
+import tracemalloc
+import argparse
+from datetime import datetime, timedelta
+from email.utils import format_datetime
+
+# Add the parent directory to the Python path so we can import the main module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from feed_reader import StreamingFeedReader
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'rss')
+CHUNK_SIZE = 16384
+ITEM_PATTERN = re.compile(rb'<item>.*?</item>', re.S)
+
+
+def load_fixtures():
+    fixtures = {}
+    for name in sorted(os.listdir(FIXTURE_DIR)):
+        if name.endswith('.xml'):
+            with open(os.path.join(FIXTURE_DIR, name), 'rb') as f:
+                fixtures[name] = f.read()
+    return fixtures
+
+
+def enlarge(data, entries, now):
+    """Repeat the recorded items into a feed of entries items, one hour apart, newest first."""
+    items = ITEM_PATTERN.findall(data)
+    head = data[:data.index(items[0])]
+    tail = data[data.rindex(items[-1]) + len(items[-1]):]
+    out = [head]
+    for i in range(entries):
+        item = items[i % len(items)]
+        item = re.sub(rb'<link>(.*?)</link>', lambda m: b'<link>' + m.group(1) + b'-%d</link>' % i, item)
+        published = format_datetime(now - timedelta(hours=i)).encode()
+        item = re.sub(rb'<pubDate>.*?</pubDate>', b'<pubDate>' + published + b'</pubDate>', item)
+        out.append(item + b'\n  ')
+    out.append(tail)
+    return b''.join(out)
+
+
+def chunked(data):
+    # Mimic response.iter_content()
+    for i in range(0, len(data), CHUNK_SIZE):
+        yield data[i:i + CHUNK_SIZE]
+
+
+def with_feedparser(data, cutoff):
+    import feedparser
+
+    feed = feedparser.parse(data)
+    return [entry.link for entry in feed.entries if datetime(*entry.published_parsed[:6]) >= cutoff]
+
+
+def streaming(data, cutoff):
+    links = []
+    for entry in StreamingFeedReader(chunked(data)):
+        if entry.published < cutoff:
+            break
+        links.append(entry.link)
+    return links
+
+
+def streaming_full(data, cutoff):
+    return [entry.link for entry in StreamingFeedReader(chunked(data)) if entry.published >= cutoff]
+
+
+READERS = {
+    'feedparser': with_feedparser,
+    'stream-full': streaming_full,
+    'stream': streaming,
+}
+
+
+def bench(reader, data, cutoff, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        reader(data, cutoff)
+    elapsed = (time.perf_counter() - started) / rounds
+
+    tracemalloc.start()
+    result = reader(data, cutoff)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare feedparser with the streaming feed reader on recorded feeds")
+    parser.add_argument("--entries", type=int, default=5000, help="Items in the enlarged feed")
+    parser.add_argument("--hours", type=float, default=24, help="Only entries newer than this are wanted")
+    parser.add_argument("--rounds", type=int, default=5, help="Parses per reader and feed")
+    args = parser.parse_args()
+
+    now = datetime.utcnow().replace(microsecond=0)
+    cutoff = now - timedelta(hours=args.hours)
+    print(f"{'feed':<22}{'KiB':>8}  {'reader':<13}{'ms/feed':>10}{'peak KiB':>12}  same as first")
+
+    for name, recorded in load_fixtures().items():
+        data = enlarge(recorded, args.entries, now)
+        baseline = None
+        for reader_name, reader in READERS.items():
+            try:
+                elapsed, peak, result = bench(reader, data, cutoff, args.rounds)
+            except ImportError as e:
+                print(f"{name:<22}{len(data) / 1024:>8.0f}  {reader_name:<13}skipped: {e}")
+                continue
+            if baseline is None:
+                baseline = result
+            print(f"{name:<22}{len(data) / 1024:>8.0f}  {reader_name:<13}{elapsed * 1000:>10.2f}"
+                  f"{peak / 1024:>12.1f}  {result == baseline}")
+
+
+if __name__ == "__main__":
+    main()
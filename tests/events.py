@@ -15,6 +15,15 @@ class MockDatabase:
     def is_posted(self, content_id):
         return False  # Always return False to see all events
 
+    def filter_unposted(self, content_ids):
+        return set(content_ids)
+
+    def get_circuit(self, name):
+        return None  # Every circuit starts closed
+
+    def save_circuit(self, name, failures, opened_at):
+        pass
+
 def fetch_event_details(event_url):
     try:
         response = requests.get(event_url)
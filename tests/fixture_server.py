@@ -0,0 +1,188 @@
+import os
+import re
+import sys
+import json
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Upstream hosts and the kind of request they serve
+EVENTS_API_HOST = 'keskisuomievents.fi'
+EVENT_PAGE_HOST = 'kalenteri.jyvaskyla.fi'
+RSS_HOST = 'www.jyvaskyla.fi'
+
+
+class QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Streaming extractors close connections mid-body; that is expected
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+def load_fixture(*parts, mode='r'):
+    with open(os.path.join(FIXTURE_DIR, *parts), mode) as f:
+        return f.read()
+
+
+class FixtureServer:
+    """Local stand-in for every upstream the bot talks to.
+
+    Requests arrive as /<original host>/<original path>. The recorded
+    fixtures carry absolute timestamps, so event start times and RSS
+    publication dates are shifted by (now - recorded_at) when served, which
+    keeps the replay inside the bot's time windows whenever it runs.
+    Also answers the Mastodon endpoints the bot uses.
+    """
+
+    def __init__(self, rss_fixture=('rss', 'jyvaskyla.xml')):
+        events = json.loads(load_fixture('events_api', 'events.json'))
+        self.recorded_at = datetime.fromisoformat(events['recorded_at'])
+        self.events = events['data']
+        self.rss = load_fixture(*rss_fixture, mode='rb')
+        self.event_pages = [
+            load_fixture('event_pages', name, mode='rb')
+            for name in sorted(os.listdir(os.path.join(FIXTURE_DIR, 'event_pages')))
+            if name.endswith('.html')
+        ]
+        self.requests = Counter()
+        self.statuses = []
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        fixtures = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                fixtures.handle(self, 'GET')
+
+            def do_POST(self):
+                fixtures.handle(self, 'POST')
+
+            def log_message(self, *args):
+                pass
+
+        self._server = QuietServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_counts(self):
+        with self._lock:
+            self.requests.clear()
+
+    def rewrite(self, url):
+        """Map an upstream URL onto this server."""
+        parsed = urlparse(url)
+        query = f"?{parsed.query}" if parsed.query else ''
+        return f"{self.base_url}/{parsed.netloc}{parsed.path}{query}"
+
+    def handle(self, request, method):
+        parsed = urlparse(request.path)
+        parts = parsed.path.lstrip('/').split('/', 1)
+        host = parts[0]
+        path = '/' + (parts[1] if len(parts) > 1 else '')
+        query = parse_qs(parsed.query)
+
+        if host == 'api':
+            kind = 'mastodon'
+            length = int(request.headers.get('Content-Length') or 0)
+            status, body, content_type = self._mastodon(method, parsed.path, request.rfile.read(length))
+        elif host == EVENTS_API_HOST:
+            kind = 'events_api'
+            status, body, content_type = 200, self._events_page(query), 'application/json'
+        elif host == EVENT_PAGE_HOST:
+            kind = 'event_page'
+            status, body, content_type = 200, self._event_page(path), 'text/html; charset=utf-8'
+        elif host == RSS_HOST:
+            kind = 'rss'
+            status, body, content_type = 200, self._rss(), 'application/rss+xml; charset=utf-8'
+        else:
+            kind = 'unknown'
+            status, body, content_type = 404, b'', 'text/plain'
+
+        with self._lock:
+            self.requests[kind] += 1
+
+        request.send_response(status)
+        request.send_header('Content-Type', content_type)
+        request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def _shift(self):
+        return datetime.now(timezone.utc) - self.recorded_at
+
+    def _events_page(self, query):
+        shift = self._shift()
+        now = datetime.now(timezone.utc)
+        offset = int(query.get('offset', ['0'])[0])
+        limit = int(query.get('limit', ['100'])[0])
+
+        # Delta requests: nothing changed since the recording
+        if any(key.startswith('filter[_or]') for key in query):
+            return json.dumps({'data': []}).encode()
+
+        events = []
+        for event in self.events:
+            start = datetime.fromisoformat(event['start_time'].replace('Z', '+00:00')) + shift
+            end = datetime.fromisoformat(event['end_time'].replace('Z', '+00:00')) + shift
+            if end < now:
+                continue
+            shifted = dict(event)
+            shifted['start_time'] = start.strftime('%Y-%m-%dT%H:%M:%SZ')
+            shifted['end_time'] = end.strftime('%Y-%m-%dT%H:%M:%SZ')
+            events.append(shifted)
+        return json.dumps({'data': events[offset:offset + limit]}).encode()
+
+    def _event_page(self, path):
+        event_id = path.rstrip('/').rsplit('/', 1)[-1]
+        try:
+            page = self.event_pages[int(event_id) % len(self.event_pages)]
+        except ValueError:
+            page = self.event_pages[0]
+        return page
+
+    def _rss(self):
+        shift = self._shift()
+
+        def shift_date(match):
+            published = parsedate_to_datetime(match.group(1).decode()) + shift
+            return f"<pubDate>{format_datetime(published)}</pubDate>".encode()
+
+        return re.sub(rb'<pubDate>(.*?)</pubDate>', shift_date, self.rss)
+
+    def _mastodon(self, method, path, body):
+        if path.startswith('/api/v1/instance'):
+            return 200, json.dumps({'version': '4.2.0', 'uri': '127.0.0.1'}).encode(), 'application/json'
+        if method == 'POST' and path.startswith('/api/v1/statuses'):
+            with self._lock:
+                self.statuses.append(body)
+                status_id = len(self.statuses)
+            status = {
+                'id': str(status_id),
+                'created_at': datetime.now(timezone.utc).isoformat(),
+                'content': '',
+                'url': f"{self.base_url}/@bot/{status_id}",
+            }
+            return 200, json.dumps(status).encode(), 'application/json'
+        return 404, b'{}', 'application/json'
+